@@ -1,16 +1,35 @@
 import os
 import base64
-from io import BytesIO
+import binascii
 from datetime import datetime, timedelta
-from urllib.parse import urlparse
+from urllib.parse import urlparse, unquote, quote
 import re
 import hashlib
+import gzip
 import json
-
-from flask import Flask, request, jsonify, url_for, send_file, abort, redirect
-from sqlalchemy import create_engine, MetaData, Table, Column, Integer, Text
+import queue
+import threading
+import time
+from functools import lru_cache
+
+from flask import Flask, Response, request, jsonify, url_for, send_file, abort, redirect
+from flask.json.provider import DefaultJSONProvider
+from markupsafe import Markup, escape
+from sqlalchemy import create_engine, event, MetaData, Table, Column, Integer, Text, LargeBinary
+from sqlalchemy import select, func, case, or_, bindparam, literal_column
 from sqlalchemy.sql import text
 from sqlalchemy.pool import NullPool
+from sqlalchemy.engine import make_url
+
+try:
+    import orjson  # parse/serialização JSON mais rápida (opcional)
+except ImportError:
+    orjson = None
+
+try:
+    import pybase64 as _b64  # decode base64 com SIMD (opcional), mesma API do base64
+except ImportError:
+    _b64 = base64
 
 
 # -------------------- Config --------------------
@@ -19,27 +38,134 @@ ADMIN_KEY = os.getenv("ADMIN_KEY", "troque-isto")
 
 PRUNE_THRESHOLD = float(os.getenv("PRUNE_THRESHOLD", "0.80"))
 PRUNE_TARGET    = float(os.getenv("PRUNE_TARGET", "0.70"))
-PRUNE_BATCH     = int(os.getenv("PRUNE_BATCH", "1000"))
 MAX_ROWS        = int(os.getenv("MAX_ROWS", "500000"))
+# prune_if_needed só verifica disco/linhas a cada N gravações (a 1ª sempre verifica)
+PRUNE_CHECK_EVERY = max(1, int(os.getenv("PRUNE_CHECK_EVERY", "256")))
 UPDATE_WINDOW_SEC = int(os.getenv("UPDATE_WINDOW_SEC", "15"))
 
+# Ingestão assíncrona do /evento (fila + gravação em lote). Desligada por padrão.
+INGEST_ASYNC = os.getenv("INGEST_ASYNC", "0") == "1"
+INGEST_BATCH = int(os.getenv("INGEST_BATCH", "256"))
+# Espera (ms) por mais itens depois do primeiro antes de gravar o lote: lotes maiores
+# (um commit/fsync por lote) em troca de até esse atraso para o evento aparecer
+INGEST_LINGER_MS = float(os.getenv("INGEST_LINGER_MS", "50"))
+INGEST_QUEUE_MAX = int(os.getenv("INGEST_QUEUE_MAX", "10000"))
+
 CONFIRM_VALUE = "SIM"
 
-# Pool pequeno para reduzir RAM em planos free (pode ajustar via env)
-_DB_POOL_SIZE    = int(os.getenv("DB_POOL_SIZE", "2"))
-_DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "0"))
+# SQLite: busca do painel via FTS5 (tokenizer trigram) em vez de instr() linha a linha
+SEARCH_FTS = os.getenv("SEARCH_FTS", "1") == "1"
+
+# Cache curto (segundos) do HTML de /indicios e /confirmados; 0 desliga.
+# Qualquer escrita no banco (commit com INSERT/UPDATE/DELETE) invalida o cache.
+PAGE_CACHE_TTL = float(os.getenv("PAGE_CACHE_TTL", "10"))
+PAGE_CACHE_MAX = int(os.getenv("PAGE_CACHE_MAX", "256"))
+
+# Compressão gzip das páginas HTML e do JSON das APIs (painel/Grafana recarregam
+# a cada poucos segundos). Imagens (JPEG/PNG) já são comprimidas e ficam de fora.
+GZIP_MIN_SIZE = int(os.getenv("GZIP_MIN_SIZE", "500"))
+GZIP_LEVEL    = int(os.getenv("GZIP_LEVEL", "6"))
+
+# /api/stats lê o resumo por hora (tabela eventos_hourly, mantida por triggers)
+# em vez de agregar os eventos da janela a cada poll. "0" volta ao GROUP BY em eventos.
+STATS_ROLLUP = os.getenv("STATS_ROLLUP", "1") == "1"
+# Validade (s) da resposta do /api/stats em memória; 0 desliga
+STATS_CACHE_TTL = float(os.getenv("STATS_CACHE_TTL", "30"))
+
+# Teto do ?limit= do /api/events (linhas por chamada; paginar com ?before_id=)
+API_EVENTS_MAX = int(os.getenv("API_EVENTS_MAX", "1000"))
+
+# Tamanho máximo do corpo das requisições (JSON com imagem base64 incluída).
+# Acima disso o Werkzeug responde 413 sem ler/parsear o corpo.
+MAX_BODY_MB = float(os.getenv("MAX_BODY_MB", "16"))
+
+# Imagens recebidas no /evento: "db" (padrão) decodifica o base64 uma vez na ingestão
+# e guarda os bytes crus na tabela imagens (chave = SHA-1, img_etag na linha);
+# "disk" grava o JPEG em IMG_DIR e guarda só o caminho (img_path) na linha.
+# Só use "disk" com IMG_DIR num volume persistente: no Render free o disco é
+# efêmero e os arquivos somem a cada deploy/restart.
+IMG_STORAGE = os.getenv("IMG_STORAGE", "db").strip().lower()
+IMG_DIR     = os.getenv("IMG_DIR", os.path.join("static", "ev"))
+# Tamanho máximo de uma imagem decodificada (estimado pelo comprimento do base64,
+# antes de decodificar). Acima disso o /evento responde 413.
+IMG_MAX_MB  = float(os.getenv("IMG_MAX_MB", "8"))
+# IMG_BACKFILL=1 move em segundo plano as imagens base64 antigas (coluna imagem)
+# para o armazenamento de IMG_STORAGE (tabela imagens ou IMG_DIR), IMG_BACKFILL_BATCH
+# linhas por vez. Desligado por padrão: a migração apaga o base64 da linha, então
+# com "disk" só ligue com IMG_DIR num volume persistente (em disco efêmero se perdem).
+IMG_BACKFILL = os.getenv("IMG_BACKFILL", "0") == "1"
+IMG_BACKFILL_BATCH = int(os.getenv("IMG_BACKFILL_BATCH", "100"))
+_IMG_MAX_BYTES = int(IMG_MAX_MB * 1024 * 1024)
+# Fatia do base64 decodificada por vez (múltiplo de 4 para não quebrar quartetos)
+_B64_CHUNK = 64 * 1024
+
+# Pool pequeno para reduzir RAM em planos free (pode ajustar via env).
+# Uma conexão por thread do gunicorn (GUNICORN_THREADS, gunicorn.conf.py) + a do
+# gravador da fila; o overflow cobre os jobs de fundo curtos (VACUUM, optimize,
+# migração de imagens) sem fazer request esperar o pool_timeout.
+_DB_POOL_SIZE    = int(os.getenv("DB_POOL_SIZE", str(int(os.getenv("GUNICORN_THREADS", "4")) + 1)))
+_DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "2"))
 _DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # segundos
 
-_engine_kwargs = dict(pool_pre_ping=True, future=True)
+# pre_ping faz um SELECT 1 a cada checkout do pool. No Postgres os keepalives TCP
+# + pool_recycle já derrubam conexões mortas; DB_PRE_PING=1 religa se precisar.
+_DB_PRE_PING = os.getenv("DB_PRE_PING", "0") == "1"
+
+_engine_kwargs = dict(pool_pre_ping=_DB_PRE_PING, future=True)
+# Obs.: pool_size * workers do gunicorn precisa caber no max_connections do Postgres.
 # Em casos extremos, você pode forçar NullPool (sem pool) definindo SQLALCHEMY_NULLPOOL=1
 if os.getenv("SQLALCHEMY_NULLPOOL", "0") == "1":
     _engine_kwargs["poolclass"] = NullPool
 else:
     _engine_kwargs.update(pool_size=_DB_POOL_SIZE, max_overflow=_DB_MAX_OVERFLOW, pool_recycle=_DB_POOL_RECYCLE)
 
+# psycopg2: UPDATEs/INSERTs em lote (executemany) viram poucos round-trips;
+# keepalives TCP detectam conexão ociosa derrubada pelo provedor
+try:
+    if make_url(DB_URL).get_driver_name() == "psycopg2":
+        _engine_kwargs["executemany_mode"] = "values_plus_batch"
+        _engine_kwargs["connect_args"] = {
+            "keepalives": 1,
+            "keepalives_idle": int(os.getenv("DB_KEEPALIVES_IDLE", "30")),
+            "keepalives_interval": 10,
+            "keepalives_count": 3,
+        }
+    elif make_url(DB_URL).get_backend_name() == "sqlite":
+        # arquivo local: espera o lock de escrita (fila/VACUUM/poda) em vez de
+        # "database is locked" após os 5 s padrão do sqlite3; não há o que pingar
+        _engine_kwargs["connect_args"] = {"timeout": float(os.getenv("SQLITE_BUSY_TIMEOUT", "30"))}
+        _engine_kwargs["pool_pre_ping"] = False
+except Exception:
+    pass
+
 engine = create_engine(DB_URL, **_engine_kwargs)
 BACKEND = engine.url.get_backend_name()
 
+# SQLite: WAL + synchronous=NORMAL (sem fsync a cada commit; leitores do painel não
+# bloqueiam a escrita do /evento). Em queda de energia perde no máximo o último commit.
+SQLITE_MMAP_MB = int(os.getenv("SQLITE_MMAP_MB", "256"))
+SQLITE_CACHE_MB = int(os.getenv("SQLITE_CACHE_MB", "64"))
+# PRAGMA optimize (estatísticas do planejador) a cada N horas; 0 = só na subida
+SQLITE_OPTIMIZE_H = float(os.getenv("SQLITE_OPTIMIZE_H", "24"))
+
+if BACKEND == "sqlite":
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_conn, _rec):
+        cur = dbapi_conn.cursor()
+        try:
+            # antes do journal_mode: só vale para banco novo (ou após o próximo VACUUM);
+            # libera páginas sem reescrever o arquivo (PRAGMA incremental_vacuum na poda)
+            cur.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            cur.execute("PRAGMA journal_mode=WAL")
+            cur.execute("PRAGMA synchronous=NORMAL")
+            cur.execute("PRAGMA temp_store=MEMORY")
+            cur.execute(f"PRAGMA mmap_size={SQLITE_MMAP_MB * 1024 * 1024}")
+            cur.execute(f"PRAGMA cache_size={-SQLITE_CACHE_MB * 1024}")  # negativo = KiB
+            # ANALYZE do optimize por amostragem: não varre as 500k linhas
+            cur.execute("PRAGMA analysis_limit=1000")
+        finally:
+            cur.close()
+
 def _sqlite_db_path_from_url(db_url: str) -> str:
     u = urlparse(db_url)
     if u.scheme != "sqlite":
@@ -62,6 +188,9 @@ eventos_tb = Table(
     Column("imagem", Text),         # base64 armazenado (legado)
     Column("identificador", Text),
     Column("img_url", Text),
+    Column("img_path", Text),       # JPEG em disco (nome relativo a IMG_DIR)
+    Column("tem_img", Text),        # '1' se há imagem própria (lista não lê a coluna imagem)
+    Column("img_etag", Text),       # SHA-1 dos bytes guardados (ETag do /img)
 
     Column("camera_id", Text),
     Column("camera_name", Text),    # << NOME DA CÂMERA
@@ -98,6 +227,23 @@ eventos_tb = Table(
     Column("em_andamento", Text),
 )
 
+# Bytes crus das imagens do modo IMG_STORAGE=db, fora da linha de eventos (a lista
+# não passa por eles). Chave = SHA-1 dos bytes: imagens repetidas ocupam uma linha.
+imagens_tb = Table(
+    "imagens", md,
+    Column("sha", Text, primary_key=True),
+    Column("dados", LargeBinary),
+)
+
+# Resumo por hora para o /api/stats (bucket = 'YYYY-MM-DD HH'), mantido por
+# triggers em eventos (ver _ensure_stats_rollup)
+eventos_hourly_tb = Table(
+    "eventos_hourly", md,
+    Column("bucket", Text, primary_key=True),
+    Column("total", Integer, nullable=False, server_default="0"),
+    Column("alertas", Integer, nullable=False, server_default="0"),
+)
+
 # =========================
 # Qualificação de Incidente (lookup + relação N:N)
 # =========================
@@ -176,7 +322,7 @@ def _seed_qualificacoes():
             )
 
 def _listar_qualificacoes():
-    with engine.begin() as conn:
+    with engine.connect() as conn:
         rows = conn.execute(text("SELECT id, nome FROM qualificacao_incidente ORDER BY id")).fetchall()
         return [{"id": int(r[0]), "nome": r[1]} for r in rows]
 
@@ -184,7 +330,7 @@ def _listar_qualificacoes():
 
 def _listar_tratamento_map():
     # Mapa por qualificacao_id para preenchimento automático no UI.
-    with engine.begin() as conn:
+    with engine.connect() as conn:
         rows = conn.execute(text(
             "SELECT qi.id AS qid, "
             "       COALESCE(g.nome,'') AS gravidade, "
@@ -212,7 +358,7 @@ def _listar_tratamento_map():
         }
     return mp
 def _qualificacoes_do_evento(evento_id: int):
-    with engine.begin() as conn:
+    with engine.connect() as conn:
         rows = conn.execute(
             text("SELECT qualificacao_id FROM evento_qualificacao WHERE evento_id=:id ORDER BY qualificacao_id"),
             {"id": int(evento_id)},
@@ -500,6 +646,21 @@ def _refresh_tratamento_flat(conn, ev_id: int):
     except Exception:
         # nunca derrubar confirmação por causa desse espelho
         app.logger.exception('Falha ao atualizar tratamento_* flatten para evento %s', ev_id)
+# Uma vez, quando a coluna tem_img é criada: marca as linhas antigas (a única
+# passada que lê o base64 de todas elas; dali em diante a lista só lê a flag)
+_SQL_MARCA_TEM_IMG = text("""
+    UPDATE eventos
+       SET tem_img = CASE WHEN (imagem IS NOT NULL AND imagem <> '')
+                            OR COALESCE(img_path,'') <> '' THEN '1' ELSE '' END
+""")
+
+# Idem para img_etag: arquivos em IMG_DIR já se chamam <sha1 dos bytes>.jpg. O base64
+# legado fica sem ETag até o backfill (o /img responde sem revalidação por hash)
+_SQL_ETAG_DOS_ARQUIVOS = text("""
+    UPDATE eventos SET img_etag = REPLACE(img_path, '.jpg', '')
+     WHERE img_path IS NOT NULL AND img_path <> ''
+""")
+
 def _ensure_columns():
     """Migração leve: adiciona colunas que faltarem."""
     if BACKEND == "sqlite":
@@ -510,6 +671,11 @@ def _ensure_columns():
 
             # existentes
             if "img_url"       not in names: add("img_url")
+            if "img_path"      not in names: add("img_path")
+            novo_tem_img = "tem_img" not in names
+            if novo_tem_img: add("tem_img")
+            novo_img_etag = "img_etag" not in names
+            if novo_img_etag: add("img_etag")
             if "camera_id"     not in names: add("camera_id")
             if "camera_name"   not in names: add("camera_name")
             if "local"         not in names: add("local")
@@ -538,10 +704,17 @@ def _ensure_columns():
             if "vitimas_aparentes"  not in names: add("vitimas_aparentes")
             if "criancas_ou_idosos" not in names: add("criancas_ou_idosos")
             if "em_andamento"       not in names: add("em_andamento")
+            if novo_tem_img:
+                conn.execute(_SQL_MARCA_TEM_IMG)
+            if novo_img_etag:
+                conn.execute(_SQL_ETAG_DOS_ARQUIVOS)
     else:
         stmts = [
             # existentes
             "ALTER TABLE eventos ADD COLUMN IF NOT EXISTS img_url TEXT",
+            "ALTER TABLE eventos ADD COLUMN IF NOT EXISTS img_path TEXT",
+            "ALTER TABLE eventos ADD COLUMN IF NOT EXISTS tem_img TEXT",
+            "ALTER TABLE eventos ADD COLUMN IF NOT EXISTS img_etag TEXT",
             "ALTER TABLE eventos ADD COLUMN IF NOT EXISTS camera_id TEXT",
             "ALTER TABLE eventos ADD COLUMN IF NOT EXISTS camera_name TEXT",
             "ALTER TABLE eventos ADD COLUMN IF NOT EXISTS local TEXT",
@@ -573,22 +746,228 @@ def _ensure_columns():
             "ALTER TABLE eventos ADD COLUMN IF NOT EXISTS em_andamento TEXT",
         ]
         with engine.begin() as conn:
+            sql_tem_col = text(
+                "SELECT 1 FROM information_schema.columns "
+                "WHERE table_name = 'eventos' AND column_name = :c"
+            )
+            novo_tem_img = conn.execute(sql_tem_col, {"c": "tem_img"}).first() is None
+            novo_img_etag = conn.execute(sql_tem_col, {"c": "img_etag"}).first() is None
             for s in stmts:
                 try:
                     conn.execute(text(s))
                 except Exception:
                     pass
+            if novo_tem_img:
+                conn.execute(_SQL_MARCA_TEM_IMG)
+            if novo_img_etag:
+                conn.execute(_SQL_ETAG_DOS_ARQUIVOS)
+
+def _ensure_indexes():
+    """Índices dos filtros do painel (status / data) e dos lookups por chave."""
+    stmts = [
+        # painel por status: WHERE status=:s ORDER BY id DESC LIMIT :lim
+        "CREATE INDEX IF NOT EXISTS ix_eventos_status_id ON eventos (status, id DESC)",
+        # filtro por dia (faixa em timestamp) e /api/stats (timestamp >= :since)
+        "CREATE INDEX IF NOT EXISTS ix_eventos_ts ON eventos (timestamp)",
+        # merge do /evento e /resposta_ia: WHERE job_id=:j [AND ...] ORDER BY id DESC LIMIT 1
+        "CREATE INDEX IF NOT EXISTS ix_eventos_job_id ON eventos (job_id, id DESC)",
+        # lookups por hash da imagem (confirmação / anexar sha)
+        "CREATE INDEX IF NOT EXISTS ix_eventos_sha256 ON eventos (sha256)",
+        # /api/events?camera_id=... ORDER BY id DESC
+        "CREATE INDEX IF NOT EXISTS ix_eventos_camera_id ON eventos (camera_id, id DESC)",
+        # confirmação pelo identificador (último evento daquele identificador)
+        "CREATE INDEX IF NOT EXISTS ix_eventos_ident ON eventos (identificador, id DESC)",
+        # limpeza de imagens órfãs em IMG_DIR: WHERE img_path IN (...)
+        "CREATE INDEX IF NOT EXISTS ix_eventos_img_path ON eventos (img_path)",
+        # limpeza da tabela imagens na poda: NOT EXISTS (... WHERE img_etag = sha)
+        "CREATE INDEX IF NOT EXISTS ix_eventos_img_etag ON eventos (img_etag)",
+    ]
+    for s in stmts:
+        try:
+            with engine.begin() as conn:
+                conn.execute(text(s))
+        except Exception as _e:
+            print('WARN: indice falhou:', s, _e)
+    if BACKEND == "postgresql":
+        _ensure_trgm_indexes()
+    elif BACKEND == "sqlite" and SEARCH_FTS:
+        _ensure_fts()
+    if STATS_ROLLUP:
+        _ensure_stats_rollup()
+
+# True quando a tabela FTS5 do SQLite está criada e sincronizada (ver _ensure_fts)
+_FTS_OK = False
+
+def _ensure_fts():
+    """SQLite: tabela FTS5 'external content' espelhando as colunas da busca.
+
+    Tokenizer trigram com case_sensitive 1: MATCH de frase dá o mesmo resultado do
+    instr() (substring, diferencia maiúsculas) para termos com 3+ caracteres, mas
+    pelo índice. Triggers mantêm o índice em dia; na criação, 'rebuild' indexa o
+    que já existe. Sem FTS5/trigram (SQLite < 3.34) a busca continua no instr().
+    """
+    global _FTS_OK
+    cols = [c.name for c in _BUSCA_COLS]
+    col_list = ", ".join(cols)
+    new_vals = ", ".join(f"new.{c}" for c in cols)
+    old_vals = ", ".join(f"old.{c}" for c in cols)
+    try:
+        with engine.begin() as conn:
+            existia = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type='table' AND name='eventos_fts'")
+            ).first() is not None
+            conn.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS eventos_fts USING fts5({col_list}, "
+                "content='eventos', content_rowid='id', tokenize='trigram case_sensitive 1')"
+            ))
+            conn.execute(text(
+                "CREATE TRIGGER IF NOT EXISTS eventos_fts_ai AFTER INSERT ON eventos BEGIN "
+                f"INSERT INTO eventos_fts(rowid, {col_list}) VALUES (new.id, {new_vals}); END"
+            ))
+            conn.execute(text(
+                "CREATE TRIGGER IF NOT EXISTS eventos_fts_ad AFTER DELETE ON eventos BEGIN "
+                f"INSERT INTO eventos_fts(eventos_fts, rowid, {col_list}) VALUES ('delete', old.id, {old_vals}); END"
+            ))
+            conn.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS eventos_fts_au AFTER UPDATE OF {col_list} ON eventos BEGIN "
+                f"INSERT INTO eventos_fts(eventos_fts, rowid, {col_list}) VALUES ('delete', old.id, {old_vals}); "
+                f"INSERT INTO eventos_fts(rowid, {col_list}) VALUES (new.id, {new_vals}); END"
+            ))
+            if not existia:
+                conn.execute(text("INSERT INTO eventos_fts(eventos_fts) VALUES ('rebuild')"))
+        _FTS_OK = True
+    except Exception as _e:
+        print('WARN: FTS5 indisponivel, busca via instr():', _e)
+
+# True quando eventos_hourly está criada e mantida pelos triggers (ver _ensure_stats_rollup)
+_ROLLUP_OK = False
+
+# Ajuste do resumo por linha: sai do bucket antigo (UPDATE/DELETE), entra no novo
+# (INSERT/UPDATE). Com isso o resumo é sempre igual ao GROUP BY sobre eventos,
+# inclusive após merge (timestamp/status atualizados) e poda.
+_ROLLUP_SAI = ("UPDATE eventos_hourly SET total = total - 1, "
+               "alertas = alertas - (CASE WHEN {r}.status = 'alerta' THEN 1 ELSE 0 END) "
+               "WHERE bucket = substr({r}.timestamp, 1, 13)")
+_ROLLUP_ENTRA = ("INSERT INTO eventos_hourly (bucket, total, alertas) "
+                 "VALUES (substr({r}.timestamp, 1, 13), 1, CASE WHEN {r}.status = 'alerta' THEN 1 ELSE 0 END) "
+                 "ON CONFLICT (bucket) DO UPDATE SET total = eventos_hourly.total + 1, "
+                 "alertas = eventos_hourly.alertas + excluded.alertas")
+
+def _ensure_stats_rollup():
+    """Triggers que mantêm eventos_hourly (contagem por hora e status) em dia.
+
+    Vale para qualquer caminho de escrita (/evento, fila, lote, poda) sem tocar
+    no código de cada um. Na criação dos triggers o resumo é recalculado a
+    partir de eventos, na mesma transação. Se falhar, /api/stats agrega direto
+    em eventos como antes.
+    """
+    global _ROLLUP_OK
+    rebuild = [
+        "DELETE FROM eventos_hourly",
+        "INSERT INTO eventos_hourly (bucket, total, alertas) "
+        "SELECT substr(timestamp, 1, 13), COUNT(*), SUM(CASE WHEN status = 'alerta' THEN 1 ELSE 0 END) "
+        "FROM eventos WHERE timestamp IS NOT NULL GROUP BY 1",
+    ]
+    try:
+        with engine.begin() as conn:
+            if BACKEND == "postgresql":
+                existia = conn.execute(
+                    text("SELECT 1 FROM pg_trigger WHERE tgname = 'eventos_hourly_trg'")
+                ).first() is not None
+                if existia:
+                    _ROLLUP_OK = True
+                    return
+                conn.execute(text(
+                    "CREATE OR REPLACE FUNCTION eventos_hourly_fn() RETURNS trigger AS $$ BEGIN "
+                    f"IF TG_OP <> 'INSERT' THEN {_ROLLUP_SAI.format(r='OLD')}; END IF; "
+                    f"IF TG_OP <> 'DELETE' AND NEW.timestamp IS NOT NULL THEN {_ROLLUP_ENTRA.format(r='NEW')}; END IF; "
+                    "RETURN NULL; END $$ LANGUAGE plpgsql"
+                ))
+                conn.execute(text(
+                    "CREATE TRIGGER eventos_hourly_trg AFTER INSERT OR DELETE OR UPDATE OF timestamp, status "
+                    "ON eventos FOR EACH ROW EXECUTE FUNCTION eventos_hourly_fn()"
+                ))
+            else:
+                existia = conn.execute(
+                    text("SELECT 1 FROM sqlite_master WHERE type='trigger' AND name='eventos_hourly_ai'")
+                ).first() is not None
+                if existia:
+                    _ROLLUP_OK = True
+                    return
+                conn.execute(text(
+                    "CREATE TRIGGER IF NOT EXISTS eventos_hourly_ai AFTER INSERT ON eventos "
+                    f"WHEN new.timestamp IS NOT NULL BEGIN {_ROLLUP_ENTRA.format(r='new')}; END"
+                ))
+                conn.execute(text(
+                    "CREATE TRIGGER IF NOT EXISTS eventos_hourly_ad AFTER DELETE ON eventos "
+                    f"WHEN old.timestamp IS NOT NULL BEGIN {_ROLLUP_SAI.format(r='old')}; END"
+                ))
+                conn.execute(text(
+                    "CREATE TRIGGER IF NOT EXISTS eventos_hourly_au AFTER UPDATE OF timestamp, status ON eventos BEGIN "
+                    f"{_ROLLUP_SAI.format(r='old')}; "
+                    f"INSERT INTO eventos_hourly (bucket, total, alertas) SELECT substr(new.timestamp, 1, 13), 1, "
+                    "CASE WHEN new.status = 'alerta' THEN 1 ELSE 0 END WHERE new.timestamp IS NOT NULL "
+                    "ON CONFLICT (bucket) DO UPDATE SET total = eventos_hourly.total + 1, "
+                    "alertas = eventos_hourly.alertas + excluded.alertas; END"
+                ))
+            for sql in rebuild:
+                conn.execute(text(sql))
+        _ROLLUP_OK = True
+    except Exception as _e:
+        print('WARN: resumo por hora (eventos_hourly) indisponivel:', _e)
+
+def _ensure_trgm_indexes():
+    """Postgres: um índice GIN pg_trgm na concatenação das colunas da busca
+    (_BUSCA_BLOB_SQL), que serve o LIKE '%termo%' do painel.
+
+    Substitui os índices por coluna (um GIN por coluna do OR, todos mantidos a
+    cada escrita). Sem permissão para a extensão, a busca segue funcionando
+    (só sem índice).
+    """
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    except Exception as _e:
+        print('WARN: pg_trgm indisponivel:', _e)
+        return
+    stmts = [f"CREATE INDEX IF NOT EXISTS ix_eventos_busca_trgm ON eventos USING gin (({_BUSCA_BLOB_SQL}) gin_trgm_ops)"]
+    stmts += [f"DROP INDEX IF EXISTS ix_eventos_{c.name}_trgm" for c in _BUSCA_COLS]
+    for s in stmts:
+        try:
+            with engine.begin() as conn:
+                conn.execute(text(s))
+        except Exception as _e:
+            print('WARN: indice falhou:', s, _e)
+
+def _sqlite_optimize(mask=None):
+    # estatísticas (sqlite_stat1) para o planejador escolher os índices certos
+    sql = "PRAGMA optimize" if mask is None else f"PRAGMA optimize={int(mask)}"
+    try:
+        with engine.begin() as c2:  # o ANALYZE grava sqlite_stat1: precisa do commit
+            c2.exec_driver_sql(sql)
+    except Exception as _e:
+        print('WARN: PRAGMA optimize falhou:', _e)
+
+def _optimize_loop():
+    while True:
+        time.sleep(SQLITE_OPTIMIZE_H * 3600)
+        _sqlite_optimize()
 
 def init_db():
     md.create_all(engine)
     _ensure_columns()
+    _ensure_indexes()
+    if BACKEND == "sqlite":
+        _sqlite_optimize(65538)  # 0x10002: analisa todas as tabelas (após criar os índices)
+        if SQLITE_OPTIMIZE_H > 0:
+            threading.Thread(target=_optimize_loop, name="sqlite-optimize", daemon=True).start()
     try:
         _seed_qualificacoes()
     except Exception as _e:
         # não impede subida do serviço se a seed falhar
         print('WARN: seed qualificacoes falhou:', _e)
     os.makedirs("static", exist_ok=True)
-    os.makedirs(os.path.join("static", "ev"), exist_ok=True)
+    os.makedirs(IMG_DIR, exist_ok=True)
 
 
     # Backfill: se já houver eventos confirmados sem tratamento_status, marca como PENDENTE (não altera tratados).
@@ -611,105 +990,149 @@ def salvar_evento(ev: dict):
         prune_if_needed(conn)
 
 # -------------------- Busca p/ painel --------------------
-def buscar_eventos(filtro=None, data=None, status=None, confirmado=None, limit=50, offset=0):
-    sql = [
-        "SELECT id, timestamp, status, objeto, descricao, identificador,",
-        "CASE WHEN imagem IS NULL OR imagem = '' THEN 0 ELSE 1 END AS tem_img,",
-        "COALESCE(img_url,'') AS img_url,",
-        "COALESCE(camera_id,'') AS camera_id,",
-        "COALESCE(camera_name,'') AS camera_name,",
-        "COALESCE(local,'') AS local,",
-        "COALESCE(model_yolo,'') AS model_yolo,",
-        "COALESCE(classes,'') AS classes,",
-        "COALESCE(yolo_conf,'') AS yolo_conf,",
-        "COALESCE(yolo_imgsz,'') AS yolo_imgsz,",
-        "COALESCE(llava_pt,'') AS llava_pt,",
-        "COALESCE(job_id,'') AS job_id,",
-        "COALESCE(sha256,'') AS sha256,",
-        "COALESCE(file_name,'') AS file_name,",
-        "COALESCE(confirmado,'') AS confirmado,",
-        "COALESCE(relato_operador,'') AS relato_operador,",
-        "COALESCE(confirmado_por,'') AS confirmado_por,",
-        "COALESCE(confirmado_em,'') AS confirmado_em",
-        ", COALESCE(tratamento_status,'') AS tratamento_status"
-        ", COALESCE(tratamento_resumo,'') AS tratamento_resumo"
-        ", COALESCE(tratamento_em,'') AS tratamento_em"
-        "FROM eventos WHERE 1=1",
-    ]
-    params = {}
-
-    if filtro:
-        termos = [t.strip() for t in filtro.replace(",", " ").split() if t.strip()]
-        if termos:
-            or_parts = []
-            for i, t in enumerate(termos):
-                k = f"q{i}"
-                if BACKEND == "sqlite":
-                    expr = (
-                        f"(instr(objeto, :{k}) > 0 OR instr(descricao, :{k}) > 0 OR "
-                        f"instr(identificador, :{k}) > 0 OR instr(camera_id, :{k}) > 0 OR "
-                        f"instr(camera_name, :{k}) > 0 OR instr(local, :{k}) > 0 OR instr(job_id, :{k}) > 0 OR "
-                        f"instr(relato_operador, :{k}) > 0)"
-                    )
-                else:
-                    expr = (
-                        f"(POSITION(:{k} IN objeto) > 0 OR POSITION(:{k} IN descricao) > 0 OR "
-                        f"POSITION(:{k} IN identificador) > 0 OR POSITION(:{k} IN camera_id) > 0 OR "
-                        f"POSITION(:{k} IN camera_name) > 0 OR POSITION(:{k} IN local) > 0 OR POSITION(:{k} IN job_id) > 0 OR "
-                        f"POSITION(:{k} IN relato_operador) > 0)"
-                    )
-                or_parts.append(expr)
-                params[k] = t
-            sql.append("AND (" + " OR ".join(or_parts) + ")")
+_ev = eventos_tb.c
 
-    if data:
-        if BACKEND == "sqlite":
-            sql.append("AND substr(timestamp,1,10) = :d")
-        else:
-            sql.append("AND left(timestamp,10) = :d")
-        params["d"] = data
+# Colunas onde o filtro (palavra-chave) procura
+_BUSCA_COLS = (
+    _ev.objeto, _ev.descricao, _ev.identificador, _ev.camera_id,
+    _ev.camera_name, _ev.local, _ev.job_id, _ev.relato_operador,
+)
 
-    if status:
-        sql.append("AND status = :s")
-        params["s"] = status
+# As colunas da busca concatenadas com espaço: um predicado por termo em vez de um
+# por coluna. Os termos vêm de split() (nunca têm espaço), então não casam
+# "atravessando" duas colunas. Mesma expressão do índice GIN pg_trgm no Postgres.
+_BUSCA_BLOB_SQL = " || ' ' || ".join(f"COALESCE({c.name},'')" for c in _BUSCA_COLS)
+_BUSCA_BLOB = literal_column(f"({_BUSCA_BLOB_SQL})")
+
+# 1 se o evento tem imagem própria (base64 legado ou arquivo em IMG_DIR). Lê só a
+# flag gravada na ingestão: comparar a coluna imagem carregaria o base64 de cada linha
+_TEM_IMG = case((_ev.tem_img == "1", 1), else_=0)
+
+# SELECT base do painel (SQLAlchemy Core): a forma compilada fica no cache de
+# statements do SQLAlchemy e só os binds mudam entre requests
+_BUSCA_SELECT = select(
+    _ev.id, _ev.timestamp, _ev.status, _ev.objeto, _ev.descricao, _ev.identificador,
+    _TEM_IMG.label("tem_img"),
+    *[
+        func.coalesce(c, "").label(c.name)
+        for c in (
+            _ev.img_url, _ev.camera_id, _ev.camera_name, _ev.local,
+            _ev.model_yolo, _ev.classes, _ev.yolo_conf, _ev.yolo_imgsz, _ev.llava_pt,
+            _ev.job_id, _ev.sha256, _ev.file_name,
+            _ev.confirmado, _ev.relato_operador, _ev.confirmado_por, _ev.confirmado_em,
+            _ev.tratamento_status, _ev.tratamento_resumo, _ev.tratamento_em,
+        )
+    ],
+)
+
+def _like_escape(t):
+    return t.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def _termo_valor(t):
+    # Postgres: LIKE '%termo%' (aproveita os índices GIN pg_trgm)
+    if BACKEND == "sqlite":
+        return t
+    return f"%{_like_escape(t)}%"
+
+def _contem(col, k):
+    # busca por substring (case-sensitive), como instr()/POSITION() do SQL original
+    if BACKEND == "sqlite":
+        return func.instr(col, k) > 0
+    return col.like(k, escape="\\")
+
+@lru_cache(maxsize=128)
+def _busca_stmt(com_fts, n_termos, com_data, com_status, confirmado, cursor):
+    """SELECT do painel especializado pelo formato da busca (nº de termos, filtros
+    presentes). Montado uma vez por formato; cada request só faz o bind dos valores."""
+    stmt = _BUSCA_SELECT
+
+    if com_fts or n_termos:
+        or_parts = []
+        if com_fts:
+            # todos os termos de 3+ caracteres num único MATCH ("a" OR "b")
+            or_parts.append(_ev.id.in_(
+                select(literal_column("rowid")).select_from(text("eventos_fts"))
+                .where(text("eventos_fts MATCH :fts"))
+            ))
+        for i in range(n_termos):
+            or_parts.append(_contem(_BUSCA_BLOB, bindparam(f"q{i}")))
+        stmt = stmt.where(or_(*or_parts))
+
+    if com_data:
+        # faixa no próprio timestamp (ISO 'YYYY-MM-DD HH:MM:SS' ordena como texto),
+        # assim o índice ix_eventos_ts é usado em vez de substr()/left() por linha
+        stmt = stmt.where(_ev.timestamp >= bindparam("d0"), _ev.timestamp < bindparam("d1"))
+
+    if com_status:
+        stmt = stmt.where(_ev.status == bindparam("st"))
 
     # confirmado: "SIM" ou "NAO"
     if confirmado == "SIM":
-        sql.append("AND confirmado = :c1")
-        params["c1"] = CONFIRM_VALUE
+        stmt = stmt.where(_ev.confirmado == CONFIRM_VALUE)
     elif confirmado == "NAO":
-        sql.append("AND (confirmado IS NULL OR confirmado = '' OR confirmado <> :c2)")
-        params["c2"] = CONFIRM_VALUE
+        stmt = stmt.where(or_(_ev.confirmado.is_(None), _ev.confirmado == "", _ev.confirmado != CONFIRM_VALUE))
 
-    sql.append("ORDER BY id DESC LIMIT :lim OFFSET :off")
-    params["lim"] = int(limit)
-    params["off"] = int(offset)
+    if cursor == "after":
+        # página anterior: os 'lim' ids logo acima do cursor (invertidos em buscar_eventos)
+        return stmt.where(_ev.id > bindparam("aid")).order_by(_ev.id.asc()).limit(bindparam("lim"))
+    if cursor == "before":
+        stmt = stmt.where(_ev.id < bindparam("bid"))
 
-    with engine.begin() as conn:
-        rows = conn.execute(text(" ".join(sql)), params).all()
+    return stmt.order_by(_ev.id.desc()).limit(bindparam("lim"))
 
-    evs = []
-    for r in rows:
-        evs.append(dict(
-            id=r[0], timestamp=r[1], status=r[2], objeto=r[3],
-            descricao=r[4], identificador=r[5],
-            tem_img=bool(r[6]), img_url=r[7] or "",
-            camera_id=r[8] or "",
-            camera_name=r[9] or "",
-            local=r[10] or "",
-            model_yolo=r[11] or "", classes=r[12] or "",
-            yolo_conf=r[13] or "", yolo_imgsz=r[14] or "",
-            llava_pt=r[15] or "",
-            job_id=r[16] or "", sha256=r[17] or "", file_name=r[18] or "",
-            confirmado=r[19] or "",
-            relato_operador=r[20] or "",
-            confirmado_por=r[21] or "",
-            confirmado_em=r[22] or "",
-            tratamento_status=r[23] or "",
-            tratamento_resumo=r[24] or "",
-            tratamento_em=r[25] or "",
-        ))
-    return evs
+def buscar_eventos(filtro=None, data=None, status=None, confirmado=None, limit=50, before_id=None, after_id=None):
+    """Eventos do painel, mais novos primeiro.
+
+    Paginação por keyset (sem OFFSET): before_id traz a página seguinte (id < cursor),
+    after_id a anterior (id > cursor). Cada página é uma varredura curta no índice
+    do id, independente da profundidade.
+    """
+    params = {"lim": int(limit)}
+
+    termos = [t for t in filtro.replace(",", " ").split()] if filtro else []
+    # 'descricao' é gravada escapada (_nl2br): termo com ' " & < > também busca a
+    # forma escapada (os termos são OR entre si; as outras colunas seguem cruas)
+    termos += [e for e in (str(escape(t)) for t in termos) if e not in termos]
+    fts_termos = []
+    if _FTS_OK:
+        # trigram só casa termos com 3+ caracteres; os curtos seguem no instr()
+        fts_termos = [t for t in termos if len(t) >= 3]
+        termos = [t for t in termos if len(t) < 3]
+        if fts_termos:
+            # entre aspas: o termo vira frase literal (sem operadores do FTS5)
+            params["fts"] = " OR ".join('"' + t.replace('"', '""') + '"' for t in fts_termos)
+    for i, t in enumerate(termos):
+        params[f"q{i}"] = _termo_valor(t)
+
+    if data:
+        # limite superior exclusivo (dia seguinte) cobre também timestamps com fração;
+        # data inválida vira faixa vazia (nenhum timestamp ISO casaria mesmo)
+        params["d0"] = f"{data} 00:00:00"
+        try:
+            d1 = (datetime.strptime(data, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+            params["d1"] = f"{d1} 00:00:00"
+        except ValueError:
+            params["d1"] = params["d0"]
+
+    if status:
+        params["st"] = status
+
+    cursor = None
+    if before_id:
+        cursor = "before"
+        params["bid"] = int(before_id)
+    elif after_id:
+        cursor = "after"
+        params["aid"] = int(after_id)
+
+    stmt = _busca_stmt(bool(fts_termos), len(termos), bool(data), bool(status), confirmado, cursor)
+
+    with engine.connect() as conn:
+        # RowMapping já se comporta como dict (e.campo / e["campo"] no Jinja)
+        rows = conn.execute(stmt, params).mappings().all()
+    if cursor == "after":
+        rows.reverse()
+    return rows
 
 # -------------------- Template --------------------
 HTML_TEMPLATE = """
@@ -782,11 +1205,12 @@ HTML_TEMPLATE = """
     </form>
 
     {% for e in eventos %}
-      <div class="card {% if e.status.lower() == 'alerta' %}alerta{% endif %}">
+      {% set alerta = (e.status or '')|lower == 'alerta' %}
+      <div class="card {% if alerta %}alerta{% endif %}">
         <div class="grid">
           <div>
             {% if e.tem_img %}
-              <img class="thumb" src="{{ url_for('img', ev_id=e.id) }}" loading="lazy" alt="frame do evento">
+              <img class="thumb" src="{{ img_prefix }}{{ e.id }}" loading="lazy" alt="frame do evento">
             {% else %}
               <div class="thumb"></div>
             {% endif %}
@@ -801,7 +1225,7 @@ HTML_TEMPLATE = """
             </div>
 
             <div class="kv"><b>Identificador:</b> {{ e.identificador }}
-              <span class="badge {% if e.status.lower() == 'alerta' %}alerta{% endif %}">{{ e.status|capitalize }}</span>
+              <span class="badge {% if alerta %}alerta{% endif %}">{{ e.status|capitalize }}</span>
               {% if e.confirmado == 'SIM' %}
                 <span class="badge" style="background:#dcfce7;border-color:#bbf7d0;color:#166534;">Violência confirmada</span>
               {% endif %}
@@ -844,10 +1268,12 @@ HTML_TEMPLATE = """
     {% endfor %}
 
     <div class="pager">
-      {% if page > 1 %}
-        <a href="?filtro={{ filtro }}&data={{ data }}&page={{ page-1 }}">◀ Anterior</a>
+      {% if anterior is not none %}
+        <a href="?filtro={{ filtro }}&data={{ data }}&page={{ page-1 }}&after_id={{ anterior }}">◀ Anterior</a>
+      {% endif %}
+      {% if proxima is not none %}
+        <a href="?filtro={{ filtro }}&data={{ data }}&page={{ page+1 }}&before_id={{ proxima }}">Próxima ▶</a>
       {% endif %}
-      <a href="?filtro={{ filtro }}&data={{ data }}&page={{ page+1 }}">Próxima ▶</a>
     </div>
   </div>
 
@@ -890,7 +1316,46 @@ HTML_TEMPLATE = """
 """
 
 # -------------------- App --------------------
+class _OrjsonProvider(DefaultJSONProvider):
+    """JSON do Flask via orjson (request.json / get_json / jsonify)."""
+
+    def dumps(self, obj, **kwargs):
+        opt = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            opt |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=opt).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 app = Flask(__name__)
+app.config["MAX_CONTENT_LENGTH"] = int(MAX_BODY_MB * 1024 * 1024)
+# Atrás de nginx/apache com X-Sendfile: o proxy lê o arquivo e o worker fica livre
+app.config["USE_X_SENDFILE"] = os.getenv("USE_X_SENDFILE", "0") == "1"
+# Atrás de nginx: prefixo de uma location "internal" apontando para a pasta do app,
+# ex.: XACCEL_PREFIX=/_internal/ com  location /_internal/ { internal; alias /app/; }
+# Imagens e logos saem com X-Accel-Redirect e o nginx envia o arquivo (sendfile).
+XACCEL_PREFIX = os.getenv("XACCEL_PREFIX", "").strip()
+if orjson is not None:
+    app.json = _OrjsonProvider(app)
+
+# Acks fixos já serializados (evita montar dict + JSON a cada POST).
+# Cada chamada devolve um Response novo: o objeto não é compartilhado entre
+# requests/threads, só os bytes (imutáveis).
+_OK_BODY = b'{"ok":true}\n'
+_QUEUED_BODY = b'{"ok":true,"queued":true}\n'
+
+def _ok_response(body=_OK_BODY):
+    return Response(body, mimetype="application/json")
+
+def _json_response(obj):
+    """JSON das APIs de leitura: orjson direto para bytes (sem o str intermediário
+    do jsonify nem ordenação de chaves). Sem orjson, jsonify normal."""
+    if orjson is None:
+        return jsonify(obj)
+    # NON_STR_KEYS: as chaves de RowMapping são quoted_name (subclasse de str)
+    opt = orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE
+    return Response(orjson.dumps(obj, option=opt), mimetype="application/json")
 
 # Garante schema/seed também em deploy via gunicorn (import app:app)
 try:
@@ -905,29 +1370,178 @@ _MAIN_TEMPLATE = app.jinja_env.from_string(HTML_TEMPLATE)
 def _render_main(**ctx):
     return _MAIN_TEMPLATE.render(**ctx)
 
+# -------------------- Cache das páginas do painel --------------------
+# O painel recarrega sozinho a cada poucos segundos em cada navegador aberto;
+# com o cache, N navegadores na mesma página viram 1 consulta + 1 render por TTL.
+# Cache por processo: com vários workers, os outros só enxergam a escrita após o TTL.
+_page_cache = {}
+_page_cache_lock = threading.Lock()
+_page_cache_gen = 0
+
+def _page_cache_get(key):
+    if PAGE_CACHE_TTL <= 0:
+        return None
+    with _page_cache_lock:
+        hit = _page_cache.get(key)
+        if hit and hit[0] == _page_cache_gen and hit[1] > time.monotonic():
+            return hit[2]
+    return None
+
+def _page_cache_put(key, html, gen):
+    # gen: _page_cache_gen lida ANTES da consulta; se um commit invalidou o cache
+    # no meio, a entrada já nasce velha em vez de guardar dados de antes da escrita
+    if PAGE_CACHE_TTL <= 0:
+        return
+    with _page_cache_lock:
+        if len(_page_cache) >= PAGE_CACHE_MAX:
+            _page_cache.clear()
+        _page_cache[key] = (gen, time.monotonic() + PAGE_CACHE_TTL, html)
+
+def _page_cache_invalidate():
+    global _page_cache_gen
+    with _page_cache_lock:
+        _page_cache_gen += 1
+        _page_cache.clear()
+
+@event.listens_for(engine, "after_cursor_execute")
+def _marca_escrita(conn, cursor, statement, parameters, context, executemany):
+    if not statement.lstrip()[:6].upper().startswith(("SELECT", "PRAGMA", "WITH")):
+        conn.info["_escreveu"] = True
+
+@event.listens_for(engine, "commit")
+def _invalida_no_commit(conn):
+    if conn.info.pop("_escreveu", False):
+        _page_cache_invalidate()
+
+@event.listens_for(engine, "rollback")
+def _limpa_marca(conn):
+    conn.info.pop("_escreveu", None)
+
+_PAINEL_LIMIT = 50  # eventos por página do painel
+
+def _corpo_painel(html, gz):
+    """(bytes, comprimido?) da página: gzip uma vez por render, mesmas regras do gzip_response."""
+    data = html.encode("utf-8")
+    if gz and len(data) >= GZIP_MIN_SIZE:
+        return gzip.compress(data, compresslevel=GZIP_LEVEL), True
+    return data, False
+
+def _resposta_painel(corpo):
+    data, comprimido = corpo
+    resp = Response(data, mimetype="text/html")
+    if comprimido:
+        resp.headers["Content-Encoding"] = "gzip"  # gzip_response deixa passar
+    resp.vary.add("Accept-Encoding")
+    return resp
+
+def _painel(page_title, confirmado):
+    filtro = (request.args.get("filtro") or "").strip()
+    data = (request.args.get("data") or "").strip()
+    try:
+        page = max(int(request.args.get("page") or 1), 1)
+        # page é só o contador exibido/levado nos links; quem pagina são os cursores
+        before_id = int(request.args.get("before_id") or 0)
+        after_id = int(request.args.get("after_id") or 0)
+    except ValueError:
+        return "Parâmetros inválidos: page / before_id / after_id (inteiros)", 400
+
+    # o cache guarda o corpo já comprimido: hit não passa pelo gzip de novo
+    gz = "gzip" in request.headers.get("Accept-Encoding", "")
+    key = (confirmado, filtro, data, page, before_id, after_id, gz)
+    corpo = _page_cache_get(key)
+    if corpo is not None:
+        return _resposta_painel(corpo)
+
+    gen = _page_cache_gen
+    # uma linha a mais que a página: diz se existe página além desta
+    evs = buscar_eventos(
+        filtro=filtro if filtro else None,
+        data=data if data else None,
+        status=None,
+        confirmado=confirmado,
+        limit=_PAINEL_LIMIT + 1,
+        before_id=before_id or None,
+        after_id=after_id or None
+    )
+    tem_mais = len(evs) > _PAINEL_LIMIT
+    if after_id:
+        # voltando: a linha extra é a mais nova (fica na página anterior a esta)
+        evs = evs[1:] if tem_mais else evs
+        tem_anterior, tem_proxima = tem_mais, True
+    else:
+        evs = evs[:_PAINEL_LIMIT]
+        tem_anterior, tem_proxima = bool(before_id), tem_mais
+    # cursores dos links; página vazia usa o cursor recebido (nunca fica sem saída;
+    # after_id=0 é a primeira página)
+    anterior = evs[0]["id"] if evs else max(before_id - 1, 0)
+    proxima = evs[-1]["id"] if evs else after_id + 1
+
+    html = _render_main(
+        page_title=page_title,
+        eventos=evs,
+        filtro=filtro,
+        data=data,
+        page=page,
+        anterior=anterior if tem_anterior else None,
+        proxima=proxima if tem_proxima else None,
+        logo_url=_logo_url(),
+        iaprotect_url=_iaprotect_url(),
+        # prefixo de /img/<id> resolvido uma vez por página (não url_for por linha)
+        img_prefix=url_for("img", ev_id=0)[:-1]
+    )
+    corpo = _corpo_painel(html, gz)
+    _page_cache_put(key, corpo, gen)
+    return _resposta_painel(corpo)
+
 _TRANSPARENT_PNG_B64 = "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR4nGNgYAAAAAMAASsJTYQAAAAASUVORK5CYII="
 
+# decodificado uma vez no import (antes: b64decode a cada request)
+_FALLBACK_PNG = base64.b64decode(_TRANSPARENT_PNG_B64)
+_FALLBACK_ETAG = hashlib.sha1(_FALLBACK_PNG).hexdigest()[:16]
+
+@lru_cache(maxsize=8)
+def _png_existe(path):
+    # arquivos de logo não mudam com o serviço no ar (mesma premissa de _logo_url)
+    return bool(path) and os.path.exists(path)
+
+def _send_arquivo(path, mimetype, max_age, etag=True):
+    """send_file com 304 (ETag/Last-Modified); com XACCEL_PREFIX, só os cabeçalhos
+    e o X-Accel-Redirect: o nginx lê e envia o arquivo, o worker fica livre."""
+    if not XACCEL_PREFIX:
+        return send_file(path, mimetype=mimetype, max_age=max_age, conditional=True, etag=etag)
+    st = os.stat(path)
+    resp = Response(mimetype=mimetype)
+    resp.headers["X-Accel-Redirect"] = XACCEL_PREFIX + quote(os.path.relpath(path).replace(os.sep, "/"))
+    resp.headers["Cache-Control"] = f"public, max-age={max_age}"
+    resp.set_etag(etag if isinstance(etag, str) else f"{int(st.st_mtime)}-{st.st_size}")
+    resp.last_modified = int(st.st_mtime)
+    return resp.make_conditional(request)
+
+def _send_png(path):
+    # conditional: ETag/Last-Modified -> 304 nas revalidações do navegador
+    if _png_existe(path):
+        return _send_arquivo(path, "image/png", 86400)
+    # PNG fixo de 1x1: bytes direto no Response (sem BytesIO/send_file), cache imutável
+    resp = Response(_FALLBACK_PNG, mimetype="image/png")
+    resp.headers["Cache-Control"] = "public, max-age=86400, immutable"
+    resp.set_etag(_FALLBACK_ETAG)
+    return resp.make_conditional(request)
+
 @app.route("/logo-fallback.png")
 def logo_fallback():
-    img = base64.b64decode(_TRANSPARENT_PNG_B64)
-    return send_file(BytesIO(img), mimetype="image/png", max_age=86400)
+    return _send_png(None)
 
 @app.route("/logo-uploaded.png")
 def logo_uploaded():
-    path = "Logo Rowau Preto.png"
-    if os.path.exists(path):
-        return send_file(path, mimetype="image/png", max_age=86400)
-    img = base64.b64decode(_TRANSPARENT_PNG_B64)
-    return send_file(BytesIO(img), mimetype="image/png", max_age=86400)
+    return _send_png("Logo Rowau Preto.png")
 
 @app.route("/iaprotect-uploaded.png")
 def iaprotect_uploaded():
-    path = "IAprotect.png"
-    if os.path.exists(path):
-        return send_file(path, mimetype="image/png", max_age=86400)
-    img = base64.b64decode(_TRANSPARENT_PNG_B64)
-    return send_file(BytesIO(img), mimetype="image/png", max_age=86400)
+    return _send_png("IAprotect.png")
 
+# Os arquivos de logo não mudam com o serviço no ar: resolve uma vez só
+# (evita os.path.exists a cada render dos painéis com auto-refresh)
+@lru_cache(maxsize=1)
 def _logo_url():
     if os.path.exists(os.path.join("static", "logo_rowau.png")):
         return url_for('static', filename='logo_rowau.png')
@@ -935,6 +1549,7 @@ def _logo_url():
         return url_for('logo_uploaded')
     return url_for('logo_fallback')
 
+@lru_cache(maxsize=1)
 def _iaprotect_url():
     if os.path.exists(os.path.join("static", "iaprotect.png")):
         return url_for('static', filename='iaprotect.png')
@@ -942,15 +1557,37 @@ def _iaprotect_url():
         return url_for('iaprotect_uploaded')
     return url_for('logo_fallback')
 
+# Endpoints com cache próprio (logos, imagens, estáticos): no_cache não mexe neles
+_CACHEABLE = frozenset(("logo_fallback", "logo_uploaded", "iaprotect_uploaded", "img", "static"))
+
 @app.after_request
 def no_cache(resp):
-    if request.path.startswith(("/logo-", "/img/", "/static/")):
+    if request.endpoint in _CACHEABLE:
         return resp
     resp.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
     resp.headers["Pragma"] = "no-cache"
     resp.headers["Expires"] = "0"
     return resp
 
+_GZIP_MIMETYPES = frozenset(("text/html", "application/json"))
+
+@app.after_request
+def gzip_response(resp):
+    # só texto já materializado (send_file/streams passam direto)
+    if resp.direct_passthrough or resp.is_streamed or resp.status_code != 200:
+        return resp
+    if resp.mimetype not in _GZIP_MIMETYPES or "Content-Encoding" in resp.headers:
+        return resp
+    if "gzip" not in request.headers.get("Accept-Encoding", ""):
+        return resp
+    data = resp.get_data()
+    if len(data) < GZIP_MIN_SIZE:
+        return resp
+    resp.set_data(gzip.compress(data, compresslevel=GZIP_LEVEL))
+    resp.headers["Content-Encoding"] = "gzip"
+    resp.vary.add("Accept-Encoding")
+    return resp
+
 # -------------------- Reset admin --------------------
 @app.route("/admin/reset")
 def admin_reset():
@@ -958,28 +1595,107 @@ def admin_reset():
     if key != ADMIN_KEY:
         abort(403)
     try:
-        if BACKEND == "sqlite" and DB_PATH and os.path.exists(DB_PATH):
-            os.remove(DB_PATH)
-            init_db()
-        else:
-            with engine.begin() as conn:
-                conn.execute(text("DELETE FROM eventos"))
+        # DELETE em vez de apagar o arquivo: com WAL o -wal/-shm e as conexões
+        # abertas do pool manteriam o banco antigo. Os triggers limpam FTS/agregados.
+        with engine.begin() as conn:
+            conn.execute(text("DELETE FROM eventos"))
+            conn.execute(text("DELETE FROM imagens"))
+        if BACKEND == "sqlite":
+            _incremental_vacuum()
+            _wal_checkpoint()
+        _limpa_imagens_orfas(idade_min=0)
         return "OK: banco recriado", 200
     except Exception as e:
         return f"ERRO: {e}", 500
 
 # -------------------- Imagem base64 (legado) --------------------
+# -------------------- SQL fixo dos caminhos quentes --------------------
+# text()/insert() montados uma vez no import (não a cada request)
+_INSERT_EVENTO = eventos_tb.insert()
+
+_SQL_IMG_REFS = text("SELECT COALESCE(img_path,''), COALESCE(img_url,''), COALESCE(img_etag,'') FROM eventos WHERE id=:i")
+_SQL_IMG_B64  = text("SELECT imagem FROM eventos WHERE id=:i")
+_SQL_IMG_BYTES = text("SELECT dados FROM imagens WHERE sha=:s")
+_SQL_IMAGEM_INSERT = text("INSERT INTO imagens (sha, dados) VALUES (:s, :d) ON CONFLICT (sha) DO NOTHING")
+
+_SQL_EV_POR_SHA = text("""SELECT id, timestamp FROM eventos
+                          WHERE job_id=:j AND sha256=:s
+                          ORDER BY id DESC LIMIT 1""")
+_SQL_EV_POR_JOB_RECENTE = text("""SELECT id, timestamp FROM eventos
+                                  WHERE job_id=:j AND timestamp >= :since
+                                  ORDER BY id DESC LIMIT 1""")
+_SQL_ULTIMO_POR_JOB = text("SELECT id FROM eventos WHERE job_id=:j ORDER BY id DESC LIMIT 1")
+
+_SQL_UPDATE_RESPOSTA_IA = text("""
+    UPDATE eventos
+       SET llava_pt=:llp,
+           dur_llava_ms=:dur,
+           local=COALESCE(NULLIF(:loc,''), local),
+           camera_name=COALESCE(NULLIF(:cam_name,''), camera_name),
+           sha256=COALESCE(NULLIF(sha256,''), NULLIF(:sha,'')),
+           file_name=COALESCE(NULLIF(file_name,''), NULLIF(:file,''))
+     WHERE id=:id
+""")
+
 @app.route("/img/<int:ev_id>")
 def img(ev_id: int):
-    with engine.begin() as conn:
-        row = conn.execute(text("SELECT imagem FROM eventos WHERE id=:i"), {"i": ev_id}).first()
-    if not row or not row[0]:
+    with engine.connect() as conn:
+        row = conn.execute(
+            _SQL_IMG_REFS, {"i": ev_id}
+        ).first()
+        if not row:
+            abort(404)
+        img_path, img_url, etag = row
+        # img_etag: SHA-1 dos bytes guardados, calculado na gravação (nunca o sha256
+        # vindo do cliente); revalidação responde 304 sem abrir arquivo/decodificar
+        if etag and etag in request.if_none_match:
+            return _img_304(etag)
+        # o arquivo só vale se ainda for a imagem atual (um merge pode ter trocado)
+        if img_path and (not etag or img_path == f"{etag}.jpg"):
+            path = os.path.join(IMG_DIR, img_path)
+            if os.path.isfile(path):
+                # arquivo em disco: Werkzeug serve em blocos (ou X-Sendfile), com 304
+                return _send_arquivo(path, "image/jpeg", 3600, etag=etag or True)
+        if etag:
+            # IMG_STORAGE=db: bytes crus, sem decodificar nada
+            dados = conn.execute(_SQL_IMG_BYTES, {"s": etag}).scalar()
+            if dados:
+                resp = Response(bytes(dados), mimetype="image/jpeg")
+                resp.headers["Cache-Control"] = "public, max-age=3600"
+                resp.set_etag(etag)
+                return resp
+        # a coluna pesada só é lida quando não há arquivo nem bytes
+        b64 = conn.execute(_SQL_IMG_B64, {"i": ev_id}).scalar()
+    if not b64:
+        # sem imagem armazenada: aponta para a URL externa (Grafana), se houver
+        if img_url.startswith(("http://", "https://")):
+            return redirect(img_url)
         abort(404)
+    # decodifica em fatias durante o envio (sem os bytes inteiros ao lado do base64);
+    # a 1ª fatia é decodificada aqui para base64 inválido ainda virar 404
+    fatias = _b64_fatias(b64)
     try:
-        b = base64.b64decode(row[0], validate=False)
-    except Exception:
+        primeira = next(fatias, b"")
+    except (binascii.Error, ValueError):
+        abort(404)
+    if not primeira:
         abort(404)
-    return send_file(BytesIO(b), mimetype="image/jpeg", max_age=3600)
+
+    def _stream():
+        yield primeira
+        yield from fatias
+
+    resp = Response(_stream(), mimetype="image/jpeg", direct_passthrough=True)
+    resp.headers["Cache-Control"] = "public, max-age=3600"
+    if etag:
+        resp.set_etag(etag)
+    return resp
+
+def _img_304(etag):
+    resp = Response(status=304)
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "public, max-age=3600"
+    return resp
 
 # -------------------- Helpers de parsing --------------------
 _LAVA_MARKER = re.compile(r"(?:^|\n)\s*🌐\s*Analisar\s+local:\s*", re.IGNORECASE)
@@ -1005,8 +1721,31 @@ def index():
         "GET /api/events | GET /api/stats | GET /admin/reset?key=..."
     )
 
+_now_cache = (0, "")
+
 def _now_str():
-    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    # formato "%Y-%m-%d %H:%M:%S", formatado no máximo uma vez por segundo
+    # (rajadas do /evento no mesmo segundo reaproveitam a string)
+    global _now_cache
+    t = int(time.time())
+    seg, s = _now_cache
+    if t != seg:
+        s = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(t))
+        _now_cache = (t, s)  # tupla: troca atômica entre threads
+    return s
+
+def _nl2br(s):
+    # 'descricao' é renderizada com |safe no painel: escapa o HTML uma vez na
+    # gravação e só então troca as quebras de linha por <br>.
+    # A maioria das descrições não tem quebra de linha: evita alocar outra string.
+    s = str(escape(s or ""))
+    if "\n" in s:
+        s = s.replace("\n", "<br>")
+    return s
+
+def _sem_escape(s):
+    # volta as entidades de _nl2br (&amp; &#39; ...) para o texto recebido; os <br> ficam
+    return Markup(s).unescape() if "&" in s else s
 
 
 def _close_window_html(next_url: str, message: str = "Registro atualizado. Você pode fechar esta janela."):
@@ -1029,6 +1768,14 @@ def _close_window_html(next_url: str, message: str = "Registro atualizado. Você
 def _trim(s):
     return (s or "").strip()
 
+def _first(dados, *keys):
+    """Primeiro valor não vazio entre as chaves (nomes novos + legado), já com strip."""
+    for k in keys:
+        v = dados.get(k)
+        if v:
+            return (v if isinstance(v, str) else str(v)).strip()
+    return ""
+
 def _sha1_from_b64_image(img_b64: str) -> str:
     """
     Calcula SHA-1 do JPEG/bytes armazenados em base64.
@@ -1040,53 +1787,191 @@ def _sha1_from_b64_image(img_b64: str) -> str:
     try:
         if "," in img_b64:
             img_b64 = img_b64.split(",", 1)[1].strip()
-        raw = base64.b64decode(img_b64, validate=False)
+        raw = _b64.b64decode(img_b64, validate=False)
         return hashlib.sha1(raw).hexdigest()
     except Exception:
         return ""
 
+def _decode_b64_image(img_b64: str) -> bytes:
+    """Bytes da imagem base64 (ou data URL); b"" se não decodificar."""
+    try:
+        return b"".join(_b64_fatias(img_b64))
+    except (binascii.Error, ValueError):
+        return b""
+
+def _b64_fatias(img_b64: str):
+    """Decodifica base64 (ou data URL) em fatias de _B64_CHUNK chars: nunca há
+    uma cópia inteira dos bytes da imagem em memória."""
+    if "," in img_b64:
+        img_b64 = img_b64.split(",", 1)[1]
+    img_b64 = "".join(img_b64.split())
+    for i in range(0, len(img_b64), _B64_CHUNK):
+        yield _b64.b64decode(img_b64[i:i + _B64_CHUNK])
+
+def _save_image_to_static(img_b64: str):
+    """
+    Decodifica a imagem base64 (ou data URL) e grava em IMG_DIR/<sha1>.jpg.
+    O nome é o SHA-1 dos bytes (mesmo hash de _sha1_from_b64_image), então
+    imagens repetidas reaproveitam o arquivo. Retorna (sha1, nome) ou ("", "").
+    A decodificação é feita em fatias direto no arquivo temporário, sem montar
+    os bytes inteiros da imagem em memória.
+    """
+    if not img_b64:
+        return "", ""
+    tmp = ""
+    try:
+        os.makedirs(IMG_DIR, exist_ok=True)
+        tmp = os.path.join(IMG_DIR, f".{os.getpid()}.{threading.get_ident()}.tmp")
+        h = hashlib.sha1()
+        with open(tmp, "wb") as f:
+            for chunk in _b64_fatias(img_b64):
+                h.update(chunk)
+                f.write(chunk)
+            vazio = f.tell() == 0
+        if vazio:
+            os.remove(tmp)
+            return "", ""
+        sha = h.hexdigest()
+        name = f"{sha}.jpg"
+        path = os.path.join(IMG_DIR, name)
+        if os.path.exists(path):
+            os.remove(tmp)
+            os.utime(path)  # mtime novo: a limpeza de órfãos não apaga antes da linha entrar
+        else:
+            os.replace(tmp, path)  # atômico: /img nunca vê arquivo pela metade
+        return sha, name
+    except Exception:
+        app.logger.exception("Falha ao gravar imagem em %s", IMG_DIR)
+        if tmp:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+        return "", ""
+
+_SQL_LEGADO_LOTE = text("""SELECT id, imagem FROM eventos
+                           WHERE id > :ult AND imagem IS NOT NULL AND imagem <> ''
+                             AND (img_path IS NULL OR img_path = '')
+                           ORDER BY id LIMIT :n""")
+_SQL_LEGADO_MOVE = text("""UPDATE eventos
+                              SET img_path=:p, imagem='', img_etag=:s,
+                                  sha256=COALESCE(NULLIF(sha256,''), :s)
+                            WHERE id=:id AND (img_path IS NULL OR img_path = '')""")
+
+def _migrar_imagens_legado():
+    """
+    Backfill: grava as imagens ainda em base64 no BD em IMG_DIR ("disk") ou como bytes
+    crus na tabela imagens ("db") e zera a coluna imagem, para o /img servir o arquivo
+    / os bytes em vez de decodificar a cada hit.
+    Lotes pequenos (cada linha traz a imagem inteira); paginação por id, então
+    linhas com base64 inválido ficam para trás sem travar o laço. Idempotente:
+    vários workers rodando ao mesmo tempo só repetem trabalho.
+    """
+    ult, movidos = 0, 0
+    try:
+        while True:
+            with engine.connect() as conn:
+                rows = conn.execute(_SQL_LEGADO_LOTE, {"ult": ult, "n": IMG_BACKFILL_BATCH}).all()
+            if not rows:
+                break
+            upd, blobs = [], []
+            for ev_id, img_b64 in rows:
+                if IMG_STORAGE == "disk":
+                    sha, name = _save_image_to_static(img_b64)
+                    if name:
+                        upd.append({"id": ev_id, "p": name, "s": sha})
+                    continue
+                dados = _decode_b64_image(img_b64)
+                if dados:
+                    sha = hashlib.sha1(dados).hexdigest()
+                    blobs.append({"s": sha, "d": dados})
+                    upd.append({"id": ev_id, "p": "", "s": sha})
+            ult = rows[-1][0]
+            del rows
+            if upd:
+                with engine.begin() as conn:
+                    if blobs:
+                        conn.execute(_SQL_IMAGEM_INSERT, blobs)
+                    conn.execute(_SQL_LEGADO_MOVE, upd)
+                del blobs
+                movidos += len(upd)
+            time.sleep(0.05)  # não disputa o lock de escrita com o /evento
+    except Exception:
+        app.logger.exception("Falha na migração das imagens legadas")
+    if movidos:
+        print(f"[IMG] imagens legadas movidas para {IMG_DIR}: {movidos}")
+
+if IMG_BACKFILL:
+    threading.Thread(target=_migrar_imagens_legado, name="img-backfill", daemon=True).start()
+
 def _admin_ok():
     # aceita ?key=... (querystring), key em form-data (POST), ou header X-Admin-Key
     kq = (request.values.get("key") or "").strip()
     kh = (request.headers.get("X-Admin-Key") or "").strip()
     return (kq and kq == ADMIN_KEY) or (kh and kh == ADMIN_KEY)
 
-@app.route("/evento", methods=["POST"])
-def receber_evento():
-    dados = request.json or {}
+def _img_grande(dados) -> bool:
+    # estimativa pelo comprimento do base64 (3 bytes a cada 4 chars), antes de decodificar
+    img_b64 = dados.get("image")
+    return isinstance(img_b64, str) and len(img_b64) * 3 // 4 > _IMG_MAX_BYTES
+
+def _img_grande_response():
+    return jsonify({"ok": False, "error": f"Imagem acima de {IMG_MAX_MB:g} MB"}), 413
 
+def _base_row_evento(dados: dict) -> dict:
+    """Monta a linha de eventos a partir do payload do /evento (grava a imagem no disco se for o caso)."""
     # Novos + legado
-    job_id      = _trim(dados.get("job_id"))
-    camera_id   = _trim(dados.get("camera_id"))
-    camera_name = _trim(dados.get("camera_name"))
-    local       = _trim(dados.get("local"))
+    job_id      = _first(dados, "job_id")
+    camera_id   = _first(dados, "camera_id")
+    camera_name = _first(dados, "camera_name")
+    local       = _first(dados, "local")
 
-    img_url     = _trim(dados.get("img_url") or dados.get("url") or dados.get("image_url") or dados.get("img") or "")
+    img_url     = _first(dados, "img_url", "url", "image_url", "img")
 
     # Preferir YOLO puro se vier no campo dedicado
-    yolo_desc_in = _trim(dados.get("descricao_yolo_pt"))
-    desc_raw_in  = _trim(dados.get("descricao_raw") or dados.get("description"))
-    desc_pt_in   = _trim(dados.get("descricao_pt") or dados.get("description") or "")
+    yolo_desc_in = _first(dados, "descricao_yolo_pt")
+    desc_raw_in  = _first(dados, "descricao_raw", "description")
+    desc_pt_in   = _first(dados, "descricao_pt", "description")
 
     if not yolo_desc_in and desc_pt_in:
         yolo_desc_in, llava_extra = _split_yolo_llava(desc_pt_in)
     else:
         llava_extra = ""
 
-    model_yolo  = _trim(dados.get("model_yolo") or dados.get("model"))
-    classes     = _trim(dados.get("classes"))
-    yolo_conf   = _trim(str(dados.get("yolo_conf") or dados.get("conf") or ""))
-    yolo_imgsz  = _trim(str(dados.get("yolo_imgsz") or dados.get("imgsz") or ""))
+    model_yolo  = _first(dados, "model_yolo", "model")
+    classes     = _first(dados, "classes")
+    yolo_conf   = _first(dados, "yolo_conf", "conf")
+    yolo_imgsz  = _first(dados, "yolo_imgsz", "imgsz")
 
-    sha256 = _trim(dados.get("sha256") or dados.get("img_hash") or dados.get("sha"))
-    file_name   = _trim(dados.get("file_name"))
+    sha256 = _first(dados, "sha256", "img_hash", "sha")
+    file_name   = _first(dados, "file_name")
     img_b64     = _trim(dados.get("image"))
-
-    # Se não veio hash, calcula uma vez por evento (evita varreduras caras no /confirmar)
-    if not sha256 and img_b64:
-        sha256 = _sha1_from_b64_image(img_b64)
-
-    llava_pt_in = _trim(dados.get("llava_pt")) or ""
+    img_path    = ""
+    img_etag    = ""
+    img_bytes   = b""
+
+    # Imagem vai para o disco; a linha guarda só o nome do arquivo (sem base64 no BD)
+    if img_b64 and IMG_STORAGE == "disk":
+        img_etag, img_path = _save_image_to_static(img_b64)
+        if img_path:
+            img_b64 = ""
+    elif img_b64:
+        # decodifica uma vez aqui; os bytes vão para a tabela imagens na mesma
+        # transação da linha (_separa_imagem) e o /img não decodifica mais nada
+        img_bytes = _decode_b64_image(img_b64)
+        if img_bytes:
+            img_etag = hashlib.sha1(img_bytes).hexdigest()
+            img_b64 = ""
+    # o que não foi gravado (base64 inválido, falha no disco) fica na coluna imagem;
+    # ETag do /img: hash dos bytes guardados, calculado uma vez aqui
+    if img_b64:
+        img_etag = _sha1_from_b64_image(img_b64)
+
+    # Se não veio hash, usa o da imagem (evita varreduras caras no /confirmar)
+    if not sha256:
+        sha256 = img_etag
+
+    llava_pt_in = _first(dados, "llava_pt")
     if not llava_pt_in:
         llava_pt_in = llava_extra
 
@@ -1094,9 +1979,12 @@ def receber_evento():
         "timestamp": _now_str(),
         "status": "alerta" if dados.get("detected") else "ok",
         "objeto": dados.get("object", ""),
-        "descricao": (yolo_desc_in or "").replace("\n", "<br>"),
+        "descricao": _nl2br(yolo_desc_in),
         "imagem": img_b64,
         "img_url": img_url,
+        "img_path": img_path,
+        "tem_img": "1" if (img_b64 or img_path or img_bytes) else "",
+        "img_etag": img_etag,
         "identificador": dados.get("identificador", "desconhecido"),
         "camera_id": camera_id,
         "camera_name": camera_name,
@@ -1112,157 +2000,296 @@ def receber_evento():
         "file_name": file_name,
         "llava_pt": llava_pt_in,
     }
+    if img_bytes:
+        base_row["_img"] = img_bytes  # não é coluna: sai em _separa_imagem
+    return base_row
 
-    def _row_by_keys(conn):
-        """
-        ATUALIZA SOMENTE quando:
-          1) for a MESMA imagem (sha256 igual), ou
-          2) houver job_id igual E o registro existente for muito recente (<= UPDATE_WINDOW_SEC).
-        NUNCA corrige por 'file_name' para evitar colisões com nomes estáticos.
-        """
-        if not base_row["job_id"]:
-            return None
-        # 1) sha256 idêntico (imagem igual)
-        if sha256:
-            r = conn.execute(
-                text("""SELECT id, timestamp FROM eventos
-                        WHERE job_id=:j AND sha256=:s
-                        ORDER BY id DESC LIMIT 1"""),
-                {"j": base_row["job_id"], "s": sha256}
-            ).first()
-            if r:
-                return r
-        # 2) job_id igual e janela de tempo curta
-        r = conn.execute(
-            text("""SELECT id, timestamp FROM eventos
-                    WHERE job_id=:j
-                    ORDER BY id DESC LIMIT 1"""),
-            {"j": base_row["job_id"]}
-        ).first()
-        if r:
-            try:
-                dt_prev = datetime.strptime(r[1], "%Y-%m-%d %H:%M:%S")
-                if (datetime.now() - dt_prev).total_seconds() <= UPDATE_WINDOW_SEC:
-                    return r
-            except Exception:
-                pass
-        return None
+@app.route("/evento", methods=["POST"])
+def receber_evento():
+    # corpo lido e parseado uma vez, sem guardar bytes/dict no request (payload com imagem)
+    dados = request.get_json(cache=False) or {}
+
+    # Rejeita cedo imagem grande demais, antes de decodificar
+    if _img_grande(dados):
+        return _img_grande_response()
+
+    base_row = _base_row_evento(dados)
+
+    # fila cheia (gravador atrasado): grava aqui mesmo, o POST espera o commit
+    if INGEST_ASYNC and _enfileirar_evento(base_row):
+        return _ok_response(_QUEUED_BODY)
 
     with engine.begin() as conn:
-        row = _row_by_keys(conn)
+        ev_id = _gravar_evento(conn, base_row)
+        prune_if_needed(conn)
 
-        if row:
-            # UPDATE seguro: NÃO sobrescreve campos com string vazia.
-            # Isso evita "apagar" sha256, llava_pt, img_url, imagem, etc., quando chegam eventos parciais.
-            params = {k: ("" if v is None else v) for k, v in base_row.items() if k != "timestamp"}
-            params["id"] = int(row[0])
-            params["ts"] = _now_str()
-
-            set_parts = []
-            for k in base_row.keys():
-                if k == "timestamp":
-                    continue
-                # mantém o valor existente se o payload vier vazio
-                set_parts.append(f"{k}=COALESCE(NULLIF(:{k},''), {k})")
+    return jsonify({"ok": True, "id": int(ev_id)})
 
-            conn.execute(
-                text("UPDATE eventos SET " + ", ".join(set_parts) + ", timestamp=:ts WHERE id=:id"),
-                params
-            )
-            ev_id = int(row[0])
+@app.route("/eventos_batch", methods=["POST"])
+def receber_eventos_batch():
+    """
+    Vários eventos numa requisição: {"eventos": [...]} (ou a lista direto), cada item
+    no mesmo formato do /evento. Gravados numa única transação, com os novos num
+    INSERT executemany (mesmo caminho do lote da fila): um commit por rajada.
+    """
+    dados = request.get_json(cache=False)
+    if dados is None:
+        dados = {}  # sem "or {}": uma lista vazia [] é um lote válido
+    itens = dados.get("eventos") if isinstance(dados, dict) else dados
+    if not isinstance(itens, list) or not all(isinstance(d, dict) for d in itens):
+        return jsonify({"ok": False, "error": "Esperado {\"eventos\": [...]}"}), 400
+    # valida o lote todo antes de gravar qualquer imagem
+    if any(_img_grande(d) for d in itens):
+        return _img_grande_response()
+
+    rows = [_base_row_evento(d) for d in itens]
+    if not rows:
+        return jsonify({"ok": True, "n": 0})
+
+    n = len(rows)
+    if INGEST_ASYNC:
+        for i, row in enumerate(rows):
+            if not _enfileirar_evento(row):
+                rows = rows[i:]  # fila cheia: o restante do lote é gravado aqui
+                break
+        else:
+            return jsonify({"ok": True, "queued": True, "n": n})
+
+    with engine.begin() as conn:
+        _gravar_lote(conn, [("evento", row) for row in rows])
+        prune_if_needed(conn, len(rows))
+
+    if len(rows) < n:
+        # parte foi para a fila antes de ela encher
+        return jsonify({"ok": True, "n": n, "queued": n - len(rows), "gravados": len(rows)})
+    return jsonify({"ok": True, "n": n})
+
+
+def _row_by_keys(conn, base_row):
+    """
+    ATUALIZA SOMENTE quando:
+      1) for a MESMA imagem (sha256 igual), ou
+      2) houver job_id igual E o registro existente for muito recente (<= UPDATE_WINDOW_SEC).
+    NUNCA corrige por 'file_name' para evitar colisões com nomes estáticos.
+    """
+    if not base_row["job_id"]:
+        return None
+    sha256 = base_row["sha256"]
+    # 1) sha256 idêntico (imagem igual)
+    if sha256:
+        r = conn.execute(_SQL_EV_POR_SHA, {"j": base_row["job_id"], "s": sha256}).first()
+        if r:
+            return r
+    # 2) job_id igual e janela de tempo curta (filtrada no SQL), contada a partir do
+    #    mesmo instante do evento (timestamp do base_row), sem novo datetime.now()
+    now = datetime.fromisoformat(base_row["timestamp"])
+    since = (now - timedelta(seconds=UPDATE_WINDOW_SEC)).isoformat(sep=" ", timespec="seconds")
+    return conn.execute(_SQL_EV_POR_JOB_RECENTE, {"j": base_row["job_id"], "since": since}).first()
+
+@lru_cache(maxsize=8)
+def _update_evento_sql(keys):
+    """UPDATE do merge, montado uma vez por conjunto de colunas do payload."""
+    set_parts = []
+    for k in keys:
+        if k == "timestamp":
+            continue
+        # mantém o valor existente se o payload vier vazio
+        set_parts.append(f"{k}=COALESCE(NULLIF(:{k},''), {k})")
+    return text("UPDATE eventos SET " + ", ".join(set_parts) + ", timestamp=:ts WHERE id=:id")
+
+def _separa_imagem(conn, base_row: dict) -> dict:
+    """Grava em imagens os bytes que vieram na linha (chave _img) e devolve uma cópia
+    da linha sem eles. Não altera o dict recebido: o gravador da fila pode repetir o item."""
+    if "_img" not in base_row:
+        return base_row
+    row = dict(base_row)
+    conn.execute(_SQL_IMAGEM_INSERT, {"s": row["img_etag"], "d": row.pop("_img")})
+    return row
+
+def _gravar_evento(conn, base_row: dict) -> int:
+    """Insere o evento ou atualiza o registro correspondente (mesma imagem/job). Retorna o id."""
+    base_row = _separa_imagem(conn, base_row)
+    row = _row_by_keys(conn, base_row)
+
+    if row:
+        # UPDATE seguro: NÃO sobrescreve campos com string vazia.
+        # Isso evita "apagar" sha256, llava_pt, img_url, imagem, etc., quando chegam eventos parciais.
+        params = {k: ("" if v is None else v) for k, v in base_row.items() if k != "timestamp"}
+        params["id"] = int(row[0])
+        params["ts"] = base_row["timestamp"]  # mesmo instante do evento (um now por requisição)
+
+        conn.execute(_update_evento_sql(tuple(base_row.keys())), params)
+        return int(row[0])
+
+    r = conn.execute(_INSERT_EVENTO, base_row)
+    try:
+        return int(r.inserted_primary_key[0])
+    except Exception:
+        # fallback (sqlite)
+        try:
+            return int(conn.execute(text("SELECT last_insert_rowid()")).scalar_one())
+        except Exception:
+            # postgres: pega último id pelo MAX
+            return int(conn.execute(text("SELECT MAX(id) FROM eventos")).scalar_one())
+
+# -------------------- Ingestão assíncrona (opcional) --------------------
+# Com INGEST_ASYNC=1 o /evento e o /resposta_ia só enfileiram e respondem; uma thread grava em lotes
+# (uma transação/commit por lote). Troca: a resposta não traz o id e eventos ainda
+# na fila se perdem se o processo cair. A fila é limitada (INGEST_QUEUE_MAX): cheia,
+# o POST grava de forma síncrona (contrapressão em vez de RAM sem limite).
+_INGEST_Q = queue.Queue(maxsize=INGEST_QUEUE_MAX)
+_ingest_thread = None
+_ingest_lock = threading.Lock()
+
+def _gravar_lote(conn, batch):
+    """Grava um lote da fila. Eventos novos (sem registro correspondente) vão num
+    único INSERT executemany; antes de tratar um item cujo job_id ainda está
+    pendente, os pendentes são gravados para que o UPDATE/merge o encontre."""
+    pendentes = []
+    pend_jobs = set()
+
+    def _flush():
+        if pendentes:
+            conn.execute(eventos_tb.insert(), pendentes)
+            pendentes.clear()
+            pend_jobs.clear()
+
+    for tipo, item in batch:
+        if item.get("job_id") in pend_jobs:
+            _flush()
+        if tipo == "resposta":
+            _gravar_resposta_ia(conn, item)
+            continue
+        item = _separa_imagem(conn, item)
+        if _row_by_keys(conn, item) is None:
+            pendentes.append(item)
+            if item["job_id"]:
+                pend_jobs.add(item["job_id"])
         else:
-            r = conn.execute(eventos_tb.insert().values(**base_row))
+            _gravar_evento(conn, item)
+    _flush()
+
+def _gravar_item(conn, tipo, item):
+    if tipo == "resposta":
+        _gravar_resposta_ia(conn, item)
+    else:
+        _gravar_evento(conn, item)
+
+def _ingest_writer():
+    while True:
+        batch = [_INGEST_Q.get()]
+        prazo = time.monotonic() + INGEST_LINGER_MS / 1000.0
+        while len(batch) < INGEST_BATCH:
+            resta = prazo - time.monotonic()
             try:
-                ev_id = r.inserted_primary_key[0]
-            except Exception:
-                # fallback (sqlite)
+                if resta > 0:
+                    batch.append(_INGEST_Q.get(timeout=resta))
+                else:
+                    batch.append(_INGEST_Q.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            with engine.begin() as conn:
+                _gravar_lote(conn, batch)
+                prune_if_needed(conn, sum(1 for tipo, _ in batch if tipo == "evento"))
+        except Exception:
+            app.logger.exception("Falha ao gravar lote de %d eventos; tentando um a um", len(batch))
+            for tipo, item in batch:
                 try:
-                    ev_id = conn.execute(text("SELECT last_insert_rowid()")).scalar_one()
+                    with engine.begin() as conn:
+                        _gravar_item(conn, tipo, item)
                 except Exception:
-                    # postgres: pega último id pelo MAX
-                    ev_id = conn.execute(text("SELECT MAX(id) FROM eventos")).scalar_one()
-
-        prune_if_needed(conn)
-
-    return jsonify({"ok": True, "id": int(ev_id)})
+                    app.logger.exception("Evento descartado (job_id=%s)", item.get("job_id"))
+
+def _enfileirar_evento(item: dict, tipo: str = "evento") -> bool:
+    """Põe o item na fila do gravador. False se a fila estiver cheia."""
+    global _ingest_thread
+    if _ingest_thread is None:
+        # start preguiçoso: sobrevive a fork (gunicorn --preload) e não roda em imports de script
+        with _ingest_lock:
+            if _ingest_thread is None:
+                _ingest_thread = threading.Thread(target=_ingest_writer, name="ingest-writer", daemon=True)
+                _ingest_thread.start()
+    try:
+        _INGEST_Q.put_nowait((tipo, item))
+        return True
+    except queue.Full:
+        return False
 
 @app.route("/resposta_ia", methods=["POST"])
 def receber_resposta_ia():
-    dados = request.json or {}
-    job_id     = _trim(dados.get("job_id"))
-    ident      = _trim(dados.get("identificador"))
-    camera_id  = _trim(dados.get("camera_id"))
-    camera_name = _trim(dados.get("camera_name"))
-    local      = _trim(dados.get("local"))
-    llava_pt   = _trim(dados.get("resposta") or dados.get("llava_pt"))
-    dur_ms     = _trim(str(dados.get("dur_llava_ms") or ""))
-    sha256     = _trim(dados.get("sha256") or dados.get("img_hash") or dados.get("sha"))
-    file_name  = _trim(dados.get("file_name"))
+    dados = request.get_json(cache=False) or {}
+    resp = {
+        "job_id":      _first(dados, "job_id"),
+        "ident":       _first(dados, "identificador"),
+        "camera_id":   _first(dados, "camera_id"),
+        "camera_name": _first(dados, "camera_name"),
+        "local":       _first(dados, "local"),
+        "llava_pt":    _first(dados, "resposta", "llava_pt"),
+        "dur_ms":      _trim(str(dados.get("dur_llava_ms") or "")),
+        "sha256":      _first(dados, "sha256", "img_hash", "sha"),
+        "file_name":   _first(dados, "file_name"),
+    }
 
+    # mesma fila do /evento: a ordem de chegada evento -> resposta é preservada
+    if INGEST_ASYNC and _enfileirar_evento(resp, tipo="resposta"):
+        return _ok_response(_QUEUED_BODY)
 
     with engine.begin() as conn:
-        target_id = None
-        if job_id:
-            row = conn.execute(
-                text("SELECT id FROM eventos WHERE job_id=:j ORDER BY id DESC LIMIT 1"),
-                {"j": job_id}
-            ).first()
-            if row:
-                target_id = row[0]
-
-        if target_id is None:
-            ev = {
-                "timestamp": _now_str(),
-                "status": "ok",
-                "objeto": "Análise IA",
-                "descricao": (llava_pt or "").replace("\n", "<br>"),
-                "imagem": "",
-                "img_url": "",
-                "identificador": ident or "desconhecido",
-                "camera_id": camera_id,
-                "camera_name": camera_name,
-                "local": local,
-                "descricao_raw": "",
-                "descricao_pt": "",
-                "model_yolo": "",
-                "classes": "",
-                "yolo_conf": "",
-                "yolo_imgsz": "",
-                "job_id": job_id or sha256,
-                "sha256": sha256,
-                "file_name": file_name,
-                "llava_pt": llava_pt,
-                "dur_llava_ms": dur_ms,
-
-            }
-            conn.execute(eventos_tb.insert().values(**ev))
-        else:
-            conn.execute(
-                text("""
-                UPDATE eventos
-                   SET llava_pt=:llp,
-                       dur_llava_ms=:dur,
-                       local=COALESCE(NULLIF(:loc,''), local),
-                       camera_name=COALESCE(NULLIF(:cam_name,''), camera_name),
-                       sha256=COALESCE(NULLIF(sha256,''), NULLIF(:sha,'')),
-                       file_name=COALESCE(NULLIF(file_name,''), NULLIF(:file,''))
-                 WHERE id=:id
-                """),
-                {
-                    "llp": llava_pt,
-                    "dur": dur_ms,
-                    "loc": local,
-                    "cam_name": camera_name,
-                    "sha": sha256,
-                    "file": file_name,
-                    "id": target_id
-                }
-            )
+        _gravar_resposta_ia(conn, resp)
+        prune_if_needed(conn)
 
+    return _ok_response()
 
-        prune_if_needed(conn)
+def _gravar_resposta_ia(conn, resp: dict):
+    """Anexa a resposta da IA ao evento do job_id (ou cria um evento 'Análise IA')."""
+    job_id = resp["job_id"]
+    sha256 = resp["sha256"]
+    target_id = None
+    if job_id:
+        row = conn.execute(_SQL_ULTIMO_POR_JOB, {"j": job_id}).first()
+        if row:
+            target_id = row[0]
+
+    if target_id is None:
+        ev = {
+            "timestamp": _now_str(),
+            "status": "ok",
+            "objeto": "Análise IA",
+            "descricao": _nl2br(resp["llava_pt"]),
+            "imagem": "",
+            "img_url": "",
+            "identificador": resp["ident"] or "desconhecido",
+            "camera_id": resp["camera_id"],
+            "camera_name": resp["camera_name"],
+            "local": resp["local"],
+            "descricao_raw": "",
+            "descricao_pt": "",
+            "model_yolo": "",
+            "classes": "",
+            "yolo_conf": "",
+            "yolo_imgsz": "",
+            "job_id": job_id or sha256,
+            "sha256": sha256,
+            "file_name": resp["file_name"],
+            "llava_pt": resp["llava_pt"],
+            "dur_llava_ms": resp["dur_ms"],
+        }
+        conn.execute(_INSERT_EVENTO, ev)
+    else:
+        conn.execute(
+            _SQL_UPDATE_RESPOSTA_IA,
+            {
+                "llp": resp["llava_pt"],
+                "dur": resp["dur_ms"],
+                "loc": resp["local"],
+                "cam_name": resp["camera_name"],
+                "sha": sha256,
+                "file": resp["file_name"],
+                "id": target_id
+            }
+        )
 
-    return jsonify({"ok": True})
 # -------------------- UI de confirmação (navegador) --------------------
 CONFIRM_UI_TEMPLATE = """
 <!doctype html>
@@ -1575,17 +2602,37 @@ def _render_confirm(**ctx):
     return _CONFIRM_TEMPLATE.render(**ctx)
 
 
+def _sha_para_confirmar(conn, ev_id: int) -> str:
+    """SHA a gravar na confirmação: '' se o evento já tem sha256; senão o SHA-1 da
+    imagem base64 legada. O blob só é lido quando o hash realmente falta."""
+    sha_atual = conn.execute(
+        text("SELECT COALESCE(sha256,'') FROM eventos WHERE id=:id"), {"id": ev_id}
+    ).scalar()
+    if sha_atual or sha_atual is None:
+        return ""
+    img_atual = conn.execute(
+        text("SELECT COALESCE(imagem,'') FROM eventos WHERE id=:id"), {"id": ev_id}
+    ).scalar()
+    return _sha1_from_b64_image(img_atual) if img_atual else ""
+
 def _load_event_by_id(ev_id: int):
-    with engine.begin() as conn:
+    with engine.connect() as conn:
         r = conn.execute(text("""
-            SELECT id, timestamp, status, objeto, descricao, identificador,
+            SELECT id,
+                   COALESCE(timestamp,'') AS timestamp,
+                   COALESCE(status,'') AS status,
+                   COALESCE(objeto,'') AS objeto,
+                   COALESCE(descricao,'') AS descricao,
+                   COALESCE(identificador,'') AS identificador,
                    CASE
-                     WHEN (imagem IS NULL OR imagem = '') AND COALESCE(img_url,'') = '' THEN 0
+                     WHEN COALESCE(tem_img,'') = '' AND COALESCE(img_url,'') = '' THEN 0
                      ELSE 1
                    END AS tem_img,
                    COALESCE(img_url,'') AS img_url,
-                   COALESCE(camera_id,''), COALESCE(camera_name,''), COALESCE(local,''),
-                   COALESCE(llava_pt,''),
+                   COALESCE(camera_id,'') AS camera_id,
+                   COALESCE(camera_name,'') AS camera_name,
+                   COALESCE(local,'') AS local,
+                   COALESCE(llava_pt,'') AS llava_pt,
                    COALESCE(relato_operador,'') AS relato_operador,
                    COALESCE(confirmado_por,'') AS confirmado_por,
                    COALESCE(confirmado_em,'') AS confirmado_em,
@@ -1594,40 +2641,21 @@ def _load_event_by_id(ev_id: int):
                    COALESCE(em_andamento,'') AS em_andamento
             FROM eventos
             WHERE id=:id
-        """), {"id": ev_id}).first()
+        """), {"id": ev_id}).mappings().first()
     if not r:
         return None
 
-    desc_html = (r[4] or "")
-    desc_plain = desc_html.replace("<br>", "\n")
-
-    return {
-        "id": r[0],
-        "timestamp": r[1] or "",
-        "status": r[2] or "",
-        "objeto": r[3] or "",
-        "descricao_plain": desc_plain.strip(),
-        "identificador": r[5] or "",
-        "tem_img": bool(r[6]),
-        "img_url": r[7] or "",
-        "camera_id": r[8] or "",
-        "camera_name": r[9] or "",
-        "local": r[10] or "",
-        "llava_pt": r[11] or "",
-        "relato_operador": r[12] or "",
-        "confirmado_por": r[13] or "",
-        "confirmado_em": r[14] or "",
-        "vitimas_aparentes": r[15] or "",
-        "criancas_ou_idosos": r[16] or "",
-        "em_andamento": r[17] or "",
-    }
+    ev = dict(r)
+    ev["descricao_plain"] = Markup(ev.pop("descricao").replace("<br>", "\n")).unescape().strip()
+    ev["tem_img"] = bool(ev["tem_img"])
+    return ev
 
 
 
 def _load_event_by_ident(ident: str):
     if not ident:
         return None
-    with engine.begin() as conn:
+    with engine.connect() as conn:
         r = conn.execute(text("""
             SELECT id
             FROM eventos
@@ -1643,7 +2671,7 @@ def _load_event_by_sha(sha: str):
     sha = _trim(sha)
     if not sha:
         return None
-    with engine.begin() as conn:
+    with engine.connect() as conn:
         r = conn.execute(text("""
             SELECT id
             FROM eventos
@@ -1704,6 +2732,10 @@ def _try_attach_sha_to_recent_events(sha: str, limit: int = 400):
 
 
 
+# regex do nome de arquivo das imagens (compiladas uma vez)
+_URL_TS_RE  = re.compile(r"_(\d{8})_(\d{6})_")
+_URL_CAM_RE = re.compile(r"^cam(\d+)$", re.IGNORECASE)
+
 def _infer_meta_from_url(url_img: str):
     """Extrai camera_id/camera_name e timestamp do nome do arquivo na URL.
     Padrões suportados:
@@ -1716,7 +2748,6 @@ def _infer_meta_from_url(url_img: str):
         return ("", "", "")
 
     try:
-        from urllib.parse import urlparse, unquote
         p = urlparse(url_img)
         base = unquote((p.path or "").split("/")[-1])
     except Exception:
@@ -1728,7 +2759,7 @@ def _infer_meta_from_url(url_img: str):
 
     name = base.rsplit(".", 1)[0]  # sem extensão
 
-    m = re.search(r"_(\d{8})_(\d{6})_", name)
+    m = _URL_TS_RE.search(name)
     if not m:
         return ("", "", "")
 
@@ -1744,7 +2775,7 @@ def _infer_meta_from_url(url_img: str):
     camera_id = ""
     camera_name = ""
 
-    m2 = re.match(r"^cam(\d+)$", prefix, flags=re.IGNORECASE)
+    m2 = _URL_CAM_RE.match(prefix)
     if m2:
         camera_id = m2.group(1)
     else:
@@ -1974,16 +3005,7 @@ def confirmar_ui():
                     return "Relato é obrigatório para confirmar.", 400
 
                 # Preenche sha256 automaticamente ao confirmar, se estiver vazio e existir imagem base64
-                row = conn.execute(
-                    text("SELECT COALESCE(sha256,''), COALESCE(imagem,'') FROM eventos WHERE id=:id"),
-                    {"id": ev_id}
-                ).first()
-                sha_atual = (row[0] or "") if row else ""
-                img_atual = (row[1] or "") if row else ""
-
-                sha_calc = ""
-                if not sha_atual and img_atual:
-                    sha_calc = _sha1_from_b64_image(img_atual)
+                sha_calc = _sha_para_confirmar(conn, ev_id)
 
                 conn.execute(text("""
                     UPDATE eventos
@@ -2140,8 +3162,8 @@ def api_confirmar():
 
     dados = request.json or {}
     ev_id = int(dados.get("id") or 0)
-    relato = _trim(dados.get("relato") or dados.get("relato_operador"))
-    operador = _trim(dados.get("operador") or dados.get("confirmado_por"))
+    relato = _first(dados, "relato", "relato_operador")
+    operador = _first(dados, "operador", "confirmado_por")
 
     # Dados suplementares (opcional)
     sup_vitimas = "SIM" if str(dados.get("vitimas_aparentes") or "").upper() == "SIM" else ""
@@ -2180,16 +3202,7 @@ def api_confirmar():
                 return jsonify({"ok": False, "error": "SHA já confirmado em outro registro", "other_id": other_id, "id": ev_id}), 409
 
         # Preenche sha256 automaticamente ao confirmar, se estiver vazio e existir imagem base64
-        row = conn.execute(
-            text("SELECT COALESCE(sha256,''), COALESCE(imagem,'') FROM eventos WHERE id=:id"),
-            {"id": ev_id}
-        ).first()
-        sha_atual = (row[0] or "") if row else ""
-        img_atual = (row[1] or "") if row else ""
-
-        sha_calc = ""
-        if not sha_atual and img_atual:
-            sha_calc = _sha1_from_b64_image(img_atual)
+        sha_calc = _sha_para_confirmar(conn, ev_id)
 
         conn.execute(
             text("""
@@ -2218,7 +3231,7 @@ def api_confirmar():
                 "id": ev_id
             }
         )
-    return jsonify({"ok": True})
+    return _ok_response()
 
 @app.route("/api/desconfirmar", methods=["POST"])
 def api_desconfirmar():
@@ -2248,7 +3261,7 @@ def api_desconfirmar():
             """),
             {"id": ev_id}
         )
-    return jsonify({"ok": True})
+    return _ok_response()
 
 
 # -------------------- UI: editar textos de tratamento (lookup) --------------------
@@ -2489,7 +3502,7 @@ def _render_trat_edit(**ctx):
     return _TRAT_EDIT_TEMPLATE.render(**ctx)
 
 def _listar_lookup(table: str, col: str):
-    with engine.begin() as conn:
+    with engine.connect() as conn:
         rows = conn.execute(text(f"SELECT id, {col} FROM {table} ORDER BY id")).fetchall()
     out = []
     for r in rows:
@@ -2502,7 +3515,7 @@ def _listar_lookup(table: str, col: str):
 
 def _listar_matriz_tratamento_ids():
     """Retorna lista de dicts com a matriz atual (IDs) por qualificação."""
-    with engine.begin() as conn:
+    with engine.connect() as conn:
         rows = conn.execute(text(
             "SELECT qi.id, qi.nome, "
             "       qt.gravidade_id, qt.protocolo_id, qt.meio_id, qt.orgao_id "
@@ -2852,268 +3865,363 @@ def tratamentos_ui():
 # -------------------- Painéis Flask (BD) --------------------
 @app.route("/indicios")
 def indicios():
-    filtro = (request.args.get("filtro") or "").strip()
-    data = (request.args.get("data") or "").strip()
-    page = max(int(request.args.get("page") or 1), 1)
-
-    evs = buscar_eventos(
-        filtro=filtro if filtro else None,
-        data=data if data else None,
-        status=None,
-        confirmado="NAO",
-        limit=50,
-        offset=(page-1)*50
-    )
-
-    return _render_main(
-        page_title="Indícios de Violência",
-        eventos=evs,
-        filtro=filtro,
-        data=data,
-        page=page,
-        logo_url=_logo_url(),
-        iaprotect_url=_iaprotect_url()
-    )
+    return _painel("Indícios de Violência", "NAO")
 
 @app.route("/confirmados")
 def confirmados():
-    filtro = (request.args.get("filtro") or "").strip()
-    data = (request.args.get("data") or "").strip()
-    page = max(int(request.args.get("page") or 1), 1)
-
-    evs = buscar_eventos(
-        filtro=filtro if filtro else None,
-        data=data if data else None,
-        status=None,
-        confirmado="SIM",
-        limit=50,
-        offset=(page-1)*50
-    )
-
-    return _render_main(
-        page_title="Violência Confirmada",
-        eventos=evs,
-        filtro=filtro,
-        data=data,
-        page=page,
-        logo_url=_logo_url(),
-        iaprotect_url=_iaprotect_url()
-    )
+    return _painel("Violência Confirmada", "SIM")
 
 # -------------------- APIs p/ Grafana --------------------
+# SELECT base do /api/events (Core: compilado uma vez e reaproveitado pelo cache do SQLAlchemy)
+_API_EVENTS_SELECT = select(
+    _ev.id, _ev.timestamp, _ev.status, _ev.identificador,
+    *[
+        func.coalesce(c, "").label(c.name)
+        for c in (
+            _ev.camera_id, _ev.camera_name, _ev.local, _ev.objeto, _ev.descricao,
+            _ev.descricao_raw, _ev.descricao_pt,
+            _ev.model_yolo, _ev.classes, _ev.yolo_conf, _ev.yolo_imgsz,
+            _ev.llava_pt,
+            _ev.confirmado, _ev.relato_operador, _ev.confirmado_por, _ev.confirmado_em,
+            _ev.vitimas_aparentes, _ev.criancas_ou_idosos, _ev.em_andamento,
+            _ev.tratamento_status, _ev.tratamento_resumo, _ev.tratamento_em,
+        )
+    ],
+    _TEM_IMG.label("has_img"),
+)
+
 @app.route("/api/events")
 def api_events():
     since = (request.args.get("since") or "").strip()
-    limit = int(request.args.get("limit") or 200)
+    try:
+        limit = max(1, min(int(request.args.get("limit") or 200), API_EVENTS_MAX))
+        if since:
+            # 'YYYY-MM-DD' ou 'YYYY-MM-DD[ T]HH:MM[:SS]' -> mesmo formato da coluna
+            since = datetime.fromisoformat(since).isoformat(sep=" ", timespec="seconds")
+        # cursor: ?before_id=<menor id da página anterior> (busca pela PK, sem OFFSET)
+        before_id = int(request.args.get("before_id") or 0)
+    except ValueError:
+        return jsonify({"ok": False, "error": "Parâmetros inválidos: limit / before_id (inteiros) / since (YYYY-MM-DD[ HH:MM:SS])"}), 400
     camera_id = (request.args.get("camera_id") or "").strip()
     local = (request.args.get("local") or "").strip()
     status = (request.args.get("status") or "").strip()
     confirmado = (request.args.get("confirmado") or "").strip().upper()  # SIM/NAO/''
 
-    clauses = ["1=1"]
-    params = {}
+    stmt = _API_EVENTS_SELECT
+
+    if before_id:
+        stmt = stmt.where(_ev.id < before_id)
 
     if since:
-        if len(since) == 10 and since.count("-") == 2:
-            since = since + " 00:00:00"
-        clauses.append("timestamp >= :since")
-        params["since"] = since
+        stmt = stmt.where(_ev.timestamp >= since)
 
     if camera_id:
-        clauses.append("camera_id = :cid")
-        params["cid"] = camera_id
+        stmt = stmt.where(_ev.camera_id == camera_id)
 
     if local:
-        clauses.append("local LIKE :loc")
-        params["loc"] = f"%{local}%"
+        stmt = stmt.where(_ev.local.like(f"%{local}%"))
 
     if status:
-        clauses.append("status = :st")
-        params["st"] = status
+        stmt = stmt.where(_ev.status == status)
 
     if confirmado == "SIM":
-        clauses.append("confirmado = :cf")
-        params["cf"] = CONFIRM_VALUE
+        stmt = stmt.where(_ev.confirmado == CONFIRM_VALUE)
     elif confirmado == "NAO":
-        clauses.append("(confirmado IS NULL OR confirmado = '' OR confirmado <> :cf2)")
-        params["cf2"] = CONFIRM_VALUE
-
-    sql = f"""
-    SELECT id, timestamp, status, identificador, camera_id, camera_name, local, objeto,
-           descricao, COALESCE(descricao_raw,''), COALESCE(descricao_pt,''),
-           COALESCE(model_yolo,''), COALESCE(classes,''), COALESCE(yolo_conf,''), COALESCE(yolo_imgsz,''),
-           COALESCE(llava_pt,''),
-           COALESCE(confirmado,''), COALESCE(relato_operador,''), COALESCE(confirmado_por,''), COALESCE(confirmado_em,''),
-           COALESCE(vitimas_aparentes,''), COALESCE(criancas_ou_idosos,''), COALESCE(em_andamento,''),
-           COALESCE(tratamento_status,''), COALESCE(tratamento_resumo,''), COALESCE(tratamento_em,''),
-           CASE WHEN imagem IS NULL OR imagem = '' THEN 0 ELSE 1 END AS has_img
-      FROM eventos
-     WHERE {" AND ".join(clauses)}
-     ORDER BY id DESC
-     LIMIT :lim
-    """
-    params["lim"] = limit
+        stmt = stmt.where(or_(_ev.confirmado.is_(None), _ev.confirmado == "", _ev.confirmado != CONFIRM_VALUE))
 
-    with engine.begin() as conn:
-        rows = conn.execute(text(sql), params).all()
+    stmt = stmt.order_by(_ev.id.desc()).limit(limit)
+
+    with engine.connect() as conn:
+        rows = conn.execute(stmt).mappings().all()
 
+    img_prefix = url_for("img", ev_id=0, _external=True)[:-1]
     out = []
     for r in rows:
-        out.append({
-            "id": r[0],
-            "timestamp": r[1],
-            "status": r[2],
-            "identificador": r[3],
-            "camera_id": r[4] or "",
-            "camera_name": r[5] or "",
-            "local": r[6] or "",
-            "objeto": r[7] or "",
-            "descricao": r[8] or "",
-            "descricao_raw": r[9] or "",
-            "descricao_pt": r[10] or "",
-            "model_yolo": r[11] or "",
-            "classes": r[12] or "",
-            "yolo_conf": r[13] or "",
-            "yolo_imgsz": r[14] or "",
-            "llava_pt": r[15] or "",
-            "confirmado": r[16] or "",
-            "relato_operador": r[17] or "",
-            "confirmado_por": r[18] or "",
-            "confirmado_em": r[19] or "",
-            "vitimas_aparentes": r[20] or "",
-            "criancas_ou_idosos": r[21] or "",
-            "em_andamento": r[22] or "",
-            "tratamento_status": r[23] or "",
-            "tratamento_resumo": r[24] or "",
-            "tratamento_em": r[25] or "",
-            "has_img": bool(r[26]),
-            "image_url": url_for("img", ev_id=r[0], _external=True) if r[26] else ""
-        })
-    return jsonify(out)
+        # colunas já vêm nomeadas (e com COALESCE) do SELECT: sem montar dict campo a campo
+        d = dict(r)
+        d["has_img"] = bool(d["has_img"])
+        d["descricao"] = _sem_escape(d["descricao"])
+        d["image_url"] = f"{img_prefix}{d['id']}" if d["has_img"] else ""
+        out.append(d)
+    return _json_response(out)
+
+# Série do /api/stats direto em eventos (SQLite e Postgres): agregação no SQL,
+# uma linha por bucket. text() montado uma vez no import (não a cada poll do Grafana).
+_SQL_STATS_EVENTOS = {
+    "d7": text("""
+        SELECT substr(timestamp,1,10) AS dia,
+               COUNT(*) AS total,
+               SUM(CASE WHEN status='alerta' THEN 1 ELSE 0 END) AS alertas
+        FROM eventos
+        WHERE timestamp >= :since
+        GROUP BY dia
+        ORDER BY dia ASC
+    """),
+    "h24": text("""
+        SELECT substr(timestamp,1,13) AS hora,
+               COUNT(*) AS total,
+               SUM(CASE WHEN status='alerta' THEN 1 ELSE 0 END) AS alertas
+        FROM eventos
+        WHERE timestamp >= :since
+        GROUP BY hora
+        ORDER BY hora ASC
+    """),
+}
+# Mesma série lida do resumo por hora: no máximo 24 / 168 linhas por poll.
+# A janela começa na hora cheia (o bucket inicial entra inteiro).
+_SQL_STATS_ROLLUP = {
+    "d7": text("""
+        SELECT substr(bucket,1,10) AS dia, SUM(total) AS total, SUM(alertas) AS alertas
+        FROM eventos_hourly
+        WHERE bucket >= :since
+        GROUP BY dia
+        HAVING SUM(total) > 0
+        ORDER BY dia ASC
+    """),
+    "h24": text("""
+        SELECT bucket, total, alertas
+        FROM eventos_hourly
+        WHERE bucket >= :since AND total > 0
+        ORDER BY bucket ASC
+    """),
+}
+
+# Resposta do /api/stats por range, reaproveitada por STATS_CACHE_TTL segundos.
+# Só por tempo (não invalida a cada escrita como o cache do painel): com eventos
+# chegando sem parar, o poll do Grafana continuaria sempre indo ao banco.
+_stats_cache = {}
 
 @app.route("/api/stats")
 def api_stats():
-    now = datetime.now()
     rng = (request.args.get("range") or "h24").lower()
+    agora = time.monotonic()
+    hit = _stats_cache.get(rng)
+    if hit and hit[0] > agora:
+        # bytes JSON já serializados no miss: só embrulha num Response novo
+        return Response(hit[1], mimetype="application/json")
+
+    resp = _api_stats(rng)
+    if STATS_CACHE_TTL > 0 and rng in ("h24", "d7"):  # só ranges conhecidos: chave limitada
+        _stats_cache[rng] = (agora + STATS_CACHE_TTL, resp.get_data())
+    return resp
 
-    if BACKEND == "sqlite":
-        if rng == "d7":
-            sql = """
-            SELECT substr(timestamp,1,10) AS dia,
-                   COUNT(*) AS total,
-                   SUM(CASE WHEN status='alerta' THEN 1 ELSE 0 END) AS alertas
-            FROM eventos
-            WHERE timestamp >= :since
-            GROUP BY dia
-            ORDER BY dia ASC
-            """
-            since = (now - timedelta(days=7)).strftime("%Y-%m-%d 00:00:00")
-        else:
-            sql = """
-            SELECT substr(timestamp,1,13) AS hora,
-                   COUNT(*) AS total,
-                   SUM(CASE WHEN status='alerta' THEN 1 ELSE 0 END) AS alertas
-            FROM eventos
-            WHERE timestamp >= :since
-            GROUP BY hora
-            ORDER BY hora ASC
-            """
-            since = (now - timedelta(hours=24)).strftime("%Y-%m-%d %H:%M:%S")
-        with engine.begin() as conn:
-            rows = conn.execute(text(sql), {"since": since}).all()
-        data = [{"bucket": r[0], "total": int(r[1] or 0), "alertas": int(r[2] or 0)} for r in rows]
-        return jsonify({"range": rng, "series": data})
-    else:
-        if rng == "d7":
-            since = now - timedelta(days=7)
-            bucket = lambda ts: ts[:10]
-        else:
-            since = now - timedelta(hours=24)
-            bucket = lambda ts: ts[:13]
+def _api_stats(rng):
+    now = datetime.now()
 
-        with engine.begin() as conn:
-            rows = conn.execute(
-                text("SELECT timestamp, status FROM eventos WHERE timestamp >= :s"),
-                {"s": since.strftime("%Y-%m-%d %H:%M:%S")}
-            ).all()
-        agg = {}
-        for ts, st in rows:
-            key = bucket(ts)
-            a = agg.get(key, {"total": 0, "alertas": 0})
-            a["total"] += 1
-            if st == "alerta":
-                a["alertas"] += 1
-            agg[key] = a
-        series = [{"bucket": k, "total": v["total"], "alertas": v["alertas"]} for k, v in sorted(agg.items())]
-        return jsonify({"range": rng, "series": series})
+    # resumo por hora (buckets 'YYYY-MM-DD HH') ou, sem ele, direto em eventos
+    if _ROLLUP_OK:
+        stmts, fmt_dia, fmt_hora = _SQL_STATS_ROLLUP, "%Y-%m-%d 00", "%Y-%m-%d %H"
+    else:
+        stmts, fmt_dia, fmt_hora = _SQL_STATS_EVENTOS, "%Y-%m-%d 00:00:00", "%Y-%m-%d %H:%M:%S"
+    if rng == "d7":
+        sql = stmts["d7"]
+        since = (now - timedelta(days=7)).strftime(fmt_dia)
+    else:
+        sql = stmts["h24"]
+        since = (now - timedelta(hours=24)).strftime(fmt_hora)
+    with engine.connect() as conn:
+        rows = conn.execute(sql, {"since": since}).all()
+    data = [{"bucket": r[0], "total": int(r[1] or 0), "alertas": int(r[2] or 0)} for r in rows]
+    return _json_response({"range": rng, "series": data})
 
 # -------------------- Poda automática --------------------
-def prune_if_needed(conn):
+def _uso_disco(path):
+    st = os.statvfs(os.path.abspath(path))
+    total = st.f_frsize * st.f_blocks
+    used  = total - (st.f_frsize * st.f_bavail)
+    return (used / total if total else 0.0), total
+
+_SQL_IMAGENS_ORFAS = text("""DELETE FROM imagens
+                              WHERE NOT EXISTS (SELECT 1 FROM eventos e WHERE e.img_etag = imagens.sha)""")
+
+def _prune_ate_corte(conn, n_remover):
+    """Remove os n_remover eventos mais antigos (por id) num único DELETE.
+
+    O id de corte é achado uma vez pelo índice da PK; nada de subselect com
+    ORDER BY/LIMIT repetido em loop nem commit no meio da transação do chamador.
+    """
+    if n_remover <= 0:
+        return 0
+    corte = conn.execute(
+        text("SELECT id FROM eventos ORDER BY id ASC LIMIT 1 OFFSET :k"), {"k": n_remover - 1}
+    ).scalar()
+    if corte is None:
+        return 0
+    r = conn.execute(text("DELETE FROM eventos WHERE id <= :c"), {"c": corte})
+    # bytes (IMG_STORAGE=db) que nenhuma linha referencia mais; mesma transação
+    conn.execute(_SQL_IMAGENS_ORFAS)
+    return r.rowcount or 0
+
+_vacuum_lock = threading.Lock()
+
+def _vacuum_sqlite():
+    # VACUUM não roda dentro de transação: conexão própria, depois do commit da poda
+    # (espera o lock de escrita pelo busy timeout do SQLite)
+    if not _vacuum_lock.acquire(blocking=False):
+        return
+    try:
+        with engine.connect() as c2:
+            c2.exec_driver_sql("VACUUM")
+    except Exception as _e:
+        print('WARN: VACUUM falhou:', _e)
+    finally:
+        _vacuum_lock.release()
+    _wal_checkpoint()  # o VACUUM passa o arquivo inteiro pelo WAL
+
+def _incremental_vacuum():
+    # Pelo execute() do sqlite3 o PRAGMA incremental_vacuum só avança um passo (uma
+    # página); executescript roda o pragma até esvaziar a freelist. Conexão própria,
+    # depois do commit da poda (espera o lock de escrita pelo busy timeout).
+    try:
+        with engine.connect() as c2:
+            c2.connection.driver_connection.executescript("PRAGMA incremental_vacuum;")
+    except Exception as _e:
+        print('WARN: incremental_vacuum falhou:', _e)
+
+def _wal_checkpoint():
+    # Copia o WAL para o banco e zera o arquivo -wal (senão ele fica do tamanho
+    # da poda). TRUNCATE espera, pelo busy timeout, o commit do escritor atual.
+    try:
+        with engine.connect() as c2:
+            c2.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+    except Exception as _e:
+        print('WARN: wal_checkpoint falhou:', _e)
+
+def _tamanho_imagens(db_path):
+    """Bytes em IMG_DIR, se estiver no mesmo disco do banco (senão não entra na conta)."""
+    try:
+        if os.stat(IMG_DIR).st_dev != os.stat(db_path).st_dev:
+            return 0
+        with os.scandir(IMG_DIR) as it:
+            return sum(e.stat().st_size for e in it if e.is_file())
+    except OSError:
+        return 0
+
+# Arquivos de IMG_DIR tocados há menos que isso não são apagados: o /evento grava
+# (ou reaproveita) o JPEG antes de a linha com o img_path ser commitada.
+_IMG_ORFA_IDADE = 600
+_IMG_ORFA_LOTE = 500
+
+# FOR SHARE no Postgres: espera o commit da poda que está apagando essas linhas
+# (senão elas ainda aparecem e o arquivo fica para a próxima limpeza)
+_SQL_IMG_VIVAS = text(
+    "SELECT img_path FROM eventos WHERE img_path IN :nomes"
+    + (" FOR SHARE" if BACKEND == "postgresql" else "")
+).bindparams(bindparam("nomes", expanding=True))
+
+def _limpa_imagens_orfas(idade_min=_IMG_ORFA_IDADE):
+    """Apaga de IMG_DIR os JPEGs que nenhuma linha referencia mais (img_path).
+
+    Roda depois da poda/reset: as linhas somem, mas os arquivos ficavam no disco.
+    Vários eventos podem apontar para o mesmo arquivo (nome = SHA-1 da imagem),
+    então só sai o que não aparece em nenhuma linha.
+    """
+    if not os.path.isdir(IMG_DIR):
+        return 0
+    limite = time.time() - idade_min
+    try:
+        with os.scandir(IMG_DIR) as it:
+            nomes = [e.name for e in it
+                     if e.name.endswith(".jpg") and e.is_file() and e.stat().st_mtime < limite]
+    except OSError as _e:
+        print('WARN: limpeza de imagens falhou:', _e)
+        return 0
+    apagados = 0
+    for i in range(0, len(nomes), _IMG_ORFA_LOTE):
+        lote = nomes[i:i + _IMG_ORFA_LOTE]
+        try:
+            with engine.connect() as conn:
+                vivas = set(conn.execute(_SQL_IMG_VIVAS, {"nomes": lote}).scalars())
+        except Exception as _e:
+            print('WARN: limpeza de imagens falhou:', _e)
+            return apagados
+        for nome in lote:
+            if nome not in vivas:
+                try:
+                    os.remove(os.path.join(IMG_DIR, nome))
+                    apagados += 1
+                except OSError:
+                    pass
+    return apagados
+
+def _pos_poda(vacuum_completo):
+    # Depois do commit da poda: SQLite devolve o espaço / zera o WAL (esperando o
+    # lock de escrita pelo busy timeout) e então some com as imagens sem linha
+    if BACKEND == "sqlite":
+        if vacuum_completo:
+            _vacuum_sqlite()
+        else:
+            _incremental_vacuum()
+            _wal_checkpoint()
+    n = _limpa_imagens_orfas()
+    if n:
+        print(f"[PRUNE] imagens removidas={n}")
+
+# gravações desde o start; a verificação roda quando a contagem cruza um múltiplo
+# de PRUNE_CHECK_EVERY (lote de N linhas conta N, não 1)
+_prune_escritas = 0
+_prune_lock = threading.Lock()
+
+_SQL_PG_EST_LINHAS = text("SELECT reltuples::bigint FROM pg_class WHERE relname = 'eventos'")
+
+def prune_if_needed(conn, n=1):
+    """n = linhas gravadas pelo chamador (lotes do /eventos_batch e da fila)."""
+    global _prune_escritas
+    with _prune_lock:
+        antes = _prune_escritas
+        _prune_escritas += n
+    # existe múltiplo de PRUNE_CHECK_EVERY em [antes, antes+n)? (a 1ª sempre verifica)
+    if (antes + n - 1) // PRUNE_CHECK_EVERY == (antes - 1) // PRUNE_CHECK_EVERY:
+        return
     removed_total = 0
 
     if BACKEND == "sqlite" and DB_PATH:
         try:
-            st = os.statvfs(os.path.abspath(DB_PATH))
-            total = st.f_frsize * st.f_blocks
-            used  = total - (st.f_frsize * st.f_bavail)
-            uso = used / total if total else 0.0
+            uso, total = _uso_disco(DB_PATH)
+            db_size = os.path.getsize(DB_PATH)
+            if os.path.exists(DB_PATH + "-wal"):
+                db_size += os.path.getsize(DB_PATH + "-wal")  # páginas ainda não checkpointadas
         except Exception:
-            uso = 0.0
+            return
 
-        if uso < PRUNE_THRESHOLD:
+        if uso < PRUNE_THRESHOLD or not db_size:
             return
 
-        while uso > PRUNE_TARGET:
-            r = conn.execute(text("""
-                DELETE FROM eventos
-                WHERE id IN (
-                    SELECT id FROM eventos
-                    ORDER BY timestamp ASC
-                    LIMIT :lim
-                )
-            """), {"lim": PRUNE_BATCH})
-            conn.commit()
-            removed = r.rowcount or 0
-            if removed == 0:
-                break
-            try:
-                conn.execute(text("VACUUM"))
-                conn.commit()
-            except Exception:
-                pass
-            try:
-                st = os.statvfs(os.path.abspath(DB_PATH))
-                total = st.f_frsize * st.f_blocks
-                used  = total - (st.f_frsize * st.f_bavail)
-                uso = used / total if total else 0.0
-            except Exception:
-                break
-            removed_total += removed
+        # as imagens em IMG_DIR saem junto com as linhas (limpeza de órfãos)
+        db_size += _tamanho_imagens(DB_PATH)
+        # quanto do arquivo precisa sair para voltar ao alvo -> fração das linhas
+        frac = (uso - PRUNE_TARGET) * total / db_size
+        if frac > 1.0:
+            # nem apagando tudo o disco volta ao alvo: não é o banco que está enchendo
+            print(f'WARN: disco em {uso:.0%}, mas o banco ocupa só {db_size} bytes; poda ignorada')
+            return
+        # no máximo a folga entre o limite e o alvo por poda (12,5% com 0.80/0.70)
+        frac = min(frac, 1.0 - PRUNE_TARGET / PRUNE_THRESHOLD)
+        n_rows = conn.execute(text("SELECT COUNT(*) FROM eventos")).scalar_one()
+        removed_total = _prune_ate_corte(conn, int(n_rows * frac + 0.999))
+        if removed_total:
+            # INCREMENTAL: depois do commit devolve as páginas livres ao SO sem
+            # reescrever o arquivo. Banco antigo (sem auto_vacuum): um VACUUM completo,
+            # que também passa o arquivo para INCREMENTAL (pragma do connect)
+            vacuum_completo = conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() != 2
+            threading.Thread(target=_pos_poda, args=(vacuum_completo,),
+                             name="prune-pos", daemon=True).start()
     else:
-        # Postgres/Render: controla por quantidade de linhas
+        # Postgres/Render: controla por quantidade de linhas. Estimativa do planejador
+        # (pg_class.reltuples, sem varrer a tabela); COUNT(*) exato só quando ela passa
+        # do limite (ou se a tabela ainda não foi analisada: reltuples = -1)
+        limite = int(MAX_ROWS * PRUNE_THRESHOLD)
+        est = conn.execute(_SQL_PG_EST_LINHAS).scalar()
+        if est is not None and 0 <= est <= limite:
+            return
         total_rows = conn.execute(text("SELECT COUNT(*) FROM eventos")).scalar_one()
-        if total_rows <= int(MAX_ROWS * PRUNE_THRESHOLD):
+        if total_rows <= limite:
             return
 
         target_rows = int(MAX_ROWS * PRUNE_TARGET)
-        to_remove = max(0, total_rows - target_rows)
-
-        while to_remove > 0:
-            step = min(PRUNE_BATCH, to_remove)
-            r = conn.execute(text("""
-                DELETE FROM eventos
-                WHERE id IN (
-                    SELECT id FROM eventos
-                    ORDER BY timestamp ASC
-                    LIMIT :lim
-                )
-            """), {"lim": step})
-            conn.commit()
-            removed = r.rowcount or 0
-            if removed == 0:
-                break
-            removed_total += removed
-            to_remove -= removed
+        removed_total = _prune_ate_corte(conn, max(0, total_rows - target_rows))
+        if removed_total:
+            threading.Thread(target=_pos_poda, args=(False,), name="prune-pos", daemon=True).start()
 
     try:
         print(f"[PRUNE] removidos={removed_total}")
@@ -3122,5 +4230,6 @@ def prune_if_needed(conn):
 
 # -------------------- Main --------------------
 if __name__ == "__main__":
-    init_db()
-    app.run(host="0.0.0.0", port=10000)
+    # Só para desenvolvimento local; em produção: gunicorn -c gunicorn.conf.py app:app
+    # (init_db() já roda no import do módulo)
+    app.run(host="0.0.0.0", port=10000, threaded=True)
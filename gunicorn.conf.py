@@ -0,0 +1,16 @@
+# Configuração do gunicorn (Render: gunicorn -c gunicorn.conf.py app:app)
+#
+# Workers "gthread": o app usa psycopg2 (bloqueante) e uma thread de escrita
+# em background (INGEST_ASYNC), então threads reais são mais seguras que
+# gevent sem monkey-patch. Ajuste por env conforme a RAM do plano.
+import os
+
+bind = "0.0.0.0:" + os.getenv("PORT", "10000")
+
+worker_class = "gthread"
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+worker_tmp_dir = "/dev/shm"